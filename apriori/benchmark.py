@@ -0,0 +1,54 @@
+import random
+import sys
+import time
+
+from main import apriori, fpgrowth
+
+
+def synthetic_transactions(n, n_items, avg_len, seed=42):
+    # skewed item popularity so that a handful of items co-occur often
+    rnd = random.Random(seed)
+    items = [f"item{i}" for i in range(n_items)]
+    weights = [1.0 / (i + 1) for i in range(n_items)]
+    transactions = []
+    for _ in range(n):
+        size = max(1, min(n_items, int(rnd.expovariate(1.0 / avg_len)) + 1))
+        t = set()
+        while len(t) < size:
+            t.add(rnd.choices(items, weights)[0])
+        transactions.append(list(t))
+    return transactions
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    min_support = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    sizes = [1000, 5000, 20000, 50000]
+
+    print(f"min_support = {min_support}")
+    print(f"{'transactions':>12} | {'itemsets':>8} | {'apriori':>9} | "
+          f"{'vertical':>9} | {'fpgrowth':>9}")
+    print('-' * 60)
+    for n in sizes:
+        transactions = synthetic_transactions(n, n_items=60, avg_len=8)
+        (ap, _), t_ap = timed(apriori, transactions, min_support)
+        (vt, _), t_vt = timed(apriori, transactions, min_support,
+                              engine='vertical')
+        (fp, _), t_fp = timed(fpgrowth, transactions, min_support)
+
+        expected = {(s, c) for s, c, _ in ap}
+        if {(s, c) for s, c, _ in vt} != expected or \
+                {(s, c) for s, c, _ in fp} != expected:
+            raise SystemExit(f"Miners disagree on {n} transactions.")
+
+        print(f"{n:>12} | {len(ap):>8} | {t_ap:>8.3f}s | "
+              f"{t_vt:>8.3f}s | {t_fp:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
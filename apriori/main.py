@@ -1,4 +1,12 @@
+import argparse
 import csv
+import json
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 
 
 def read_csv_rows(filename):
@@ -19,22 +27,274 @@ def parse_data(rows):
         transactions.append(transaction)
     return transactions
 
-def apriori(transactions, min_support):
+
+class EncodedTransactions:
+    # transactions packed as item IDs in one array('I'); transaction i is
+    # items[offsets[i]:offsets[i+1]] and names[id] decodes an ID
+    def __init__(self):
+        self.offsets = array('Q', [0])
+        self.items = array('I')
+        self.names = []
+        self.ids = {}
+
+    def intern(self, name):
+        item_id = self.ids.get(name)
+        if item_id is None:
+            item_id = len(self.names)
+            self.ids[name] = item_id
+            self.names.append(name)
+        return item_id
+
+    def append(self, row):
+        for item in row:
+            if item is not None and str(item).strip() != '':
+                self.items.append(self.intern(str(item).strip()))
+        self.offsets.append(len(self.items))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, _ = i.indices(len(self))
+            part = EncodedTransactions()
+            base = self.offsets[start]
+            part.items = self.items[base:self.offsets[stop]]
+            part.offsets = array('Q', (o - base for o in self.offsets[start:stop+1]))
+            return part
+        return self.items[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        items, offsets = self.items, self.offsets
+        for i in range(len(offsets) - 1):
+            yield items[offsets[i]:offsets[i+1]]
+
+    def decode(self, itemset):
+        return [self.names[it] for it in itemset]
+
+
+def stream_csv_rows(filename, chunk_size=10000):
+    with open(filename, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+
+class TransactionsFile:
+    # re-iterable view of a transactions CSV: nothing is read until the first
+    # pass, and every pass streams the file again through parse_data
+    def __init__(self, filename, chunk_size=10000):
+        self.filename = filename
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for chunk in stream_csv_rows(self.filename, self.chunk_size):
+            yield from parse_data(chunk)
+
+
+def ingest_transactions(filename, chunk_size=10000):
+    # same cleaning as parse_data, but rows are interned chunk by chunk and
+    # never held as lists of strings
+    store = EncodedTransactions()
+    for chunk in stream_csv_rows(filename, chunk_size):
+        for row in chunk:
+            store.append(row)
+    return store
+
+
+def format_itemset(itemset, names=None):
+    items = [names[it] for it in itemset] if names is not None else itemset
+    return '{' + ','.join(sorted(items)) + '}'
+
+
+def write_frequent_itemsets(filename, freq_itemsets, names=None):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['itemset', 'count', 'support'])
+        for itemset, count, support in freq_itemsets:
+            writer.writerow([format_itemset(itemset, names), count,
+                             f"{support:.6f}"])
+
+
+def write_association_rules(filename, rules, names=None):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['antecedent', 'consequent', 'confidence',
+                         'lift', 'leverage', 'conviction'])
+        for antecedent, consequent, confidence, lift, leverage, conviction in rules:
+            writer.writerow([format_itemset(antecedent, names),
+                             format_itemset(consequent, names),
+                             f"{confidence:.6f}", f"{lift:.6f}",
+                             f"{leverage:.6f}", f"{conviction:.6f}"])
+
+
+COUNTING_ENGINES = ('horizontal', 'vertical')
+
+
+def generate_candidates(lk_1, k):
+    # join (k-1)-itemsets that share their first k-2 items in sorted order,
+    # then prune against a set so each subset lookup is O(1)
+    prev = set(lk_1)
+    groups = {}
+    for itemset in lk_1:
+        items = sorted(itemset)
+        groups.setdefault(tuple(items[:-1]), []).append(items[-1])
+
+    candidates = []
+    for prefix, tails in groups.items():
+        tails.sort()
+        for i in range(len(tails)):
+            for j in range(i+1, len(tails)):
+                c = frozenset(prefix + (tails[i], tails[j]))
+                flag = True
+                for it in prefix:
+                    if c - frozenset([it]) not in prev:
+                        flag = False
+                        break
+                if flag:
+                    candidates.append(c)
+
+    return candidates
+
+
+def build_candidate_trie(candidates):
+    # prefix trie over the sorted items of each k-candidate; the last level
+    # maps an item to the candidate's index in the counts list
+    root = {}
+    for idx, c in enumerate(candidates):
+        items = sorted(c)
+        node = root
+        for it in items[:-1]:
+            node = node.setdefault(it, {})
+        node[items[-1]] = idx
+    return root
+
+
+def walk_trie(root, items, k, hits):
+    # items are one transaction's sorted items; every k-candidate they
+    # contain is reached exactly once
+    n_items = len(items)
+    stack = [(root, 0, 0)]
+    while stack:
+        node, start, depth = stack.pop()
+        last = depth == k - 1
+        for i in range(start, n_items - (k - 1 - depth)):
+            child = node.get(items[i])
+            if child is None:
+                continue
+            if last:
+                hits[child] += 1
+            else:
+                stack.append((child, i + 1, depth + 1))
+
+
+def count_horizontal(transactions, candidates):
+    if not candidates:
+        return {}
+    k = len(candidates[0])
+    root = build_candidate_trie(candidates)
+    wanted = set()
+    for c in candidates:
+        wanted |= c
+
+    # walk the trie with each transaction's sorted items so only candidates
+    # the transaction can contain are ever reached
+    hits = [0] * len(candidates)
+    for t in transactions:
+        items = sorted({it for it in t if it in wanted})
+        if len(items) >= k:
+            walk_trie(root, items, k, hits)
+
+    return {c: cnt for c, cnt in zip(candidates, hits) if cnt}
+
+
+def count_itemsets(transactions, itemsets):
+    # one pass: per-transaction counts for every item plus subset counts for
+    # itemsets of any size, one trie per size
+    by_size = {}
+    for c in itemsets:
+        if len(c) > 1:
+            by_size.setdefault(len(c), []).append(c)
+    tries = [(k, build_candidate_trie(cs), [0] * len(cs))
+             for k, cs in by_size.items()]
+
+    item_cnt = {}
+    for t in transactions:
+        items = sorted(dict.fromkeys(t))
+        for it in items:
+            item_cnt[it] = item_cnt.get(it, 0) + 1
+        for k, root, hits in tries:
+            if len(items) >= k:
+                walk_trie(root, items, k, hits)
+
+    counts = {}
+    for k, _, hits in tries:
+        counts.update(zip(by_size[k], hits))
+    return item_cnt, counts
+
+
+def build_item_bitsets(transactions, items):
+    # one packed bitset per item, bit `tid` set when the item occurs in
+    # transaction `tid`; built through a bytearray so each item costs O(n/8)
+    nbytes = (len(transactions) + 7) // 8
+    buffers = {it: bytearray(nbytes) for it in items}
+    for tid, t in enumerate(transactions):
+        byte, mask = tid >> 3, 1 << (tid & 7)
+        for it in t:
+            buf = buffers.get(it)
+            if buf is not None:
+                buf[byte] |= mask
+    return {it: int.from_bytes(buf, 'little') for it, buf in buffers.items()}
+
+
+def count_vertical(candidates, prev_bits, item_bits):
+    # every (k-1)-subset of a pruned candidate is frequent, so its bitset is
+    # in prev_bits and one AND per candidate gives the candidate's tid-set
+    counts = {}
+    bits = {}
+    for c in candidates:
+        it = next(iter(c))
+        b = prev_bits[c - frozenset([it])] & item_bits[it]
+        counts[c] = b.bit_count()
+        bits[c] = b
+    return counts, bits
+
+
+def apriori(transactions, min_support, engine='horizontal', border=None,
+            stats=None):
     if not (0 < min_support <= 1):
         raise ValueError("min_support must be between 0 and 1")
+    if engine not in COUNTING_ENGINES:
+        raise ValueError(f"engine must be one of {COUNTING_ENGINES}")
 
     n = len(transactions)
     min_cnt = max(1, (int)(min_support*n))
+    started = time.perf_counter()
 
+    # support counts transactions, so an item repeated within one
+    # transaction still counts once
     item_cnt = {}
     for t in transactions:
-        for it in t:
+        for it in dict.fromkeys(t):
             if it not in item_cnt:
                 item_cnt[it] = 1
             else:
                 item_cnt[it] += 1
 
     l1 = [frozenset([it]) for it, cnt in item_cnt.items() if cnt >= min_cnt]
+    if stats is not None:
+        stats.append({'level': 1, 'candidates': len(item_cnt),
+                      'frequent': len(l1),
+                      'seconds': time.perf_counter() - started})
+    if border is not None:
+        # negative border: counted itemsets that turned out infrequent
+        for it, cnt in item_cnt.items():
+            if cnt < min_cnt:
+                border[frozenset([it])] = cnt
     supports = {}
     freq_itemsets = []
     for it in l1:
@@ -43,98 +303,734 @@ def apriori(transactions, min_support):
         supports[it] = support
         freq_itemsets.append((it, cnt, support))
 
+    if engine == 'vertical':
+        item_bits = build_item_bitsets(
+            transactions, [list(it)[0] for it in l1])
+        prev_bits = {frozenset([it]): b for it, b in item_bits.items()}
+
     k = 2
     lk_1 = l1
     while len(lk_1) > 0:
-        candidates = set()
-        for i in range(len(lk_1)):
-            for j in range(i+1, len(lk_1)):
-                combined = lk_1[i] | lk_1[j]
-                if len(combined) == k:
-                    candidates.add(combined)
+        started = time.perf_counter()
+        candidates = generate_candidates(lk_1, k)
 
-        candidates = list(candidates)
-        pruned_candidates = []
-        for c in candidates:
-            flag = True
-            for it in c:
-                subset = c - frozenset([it])
-                if subset not in lk_1:
-                    flag = False
-                    break
+        if engine == 'vertical':
+            counts, bits = count_vertical(candidates, prev_bits, item_bits)
+        else:
+            counts = count_horizontal(transactions, candidates)
 
-            if flag:
-                pruned_candidates.append(c)
+        lk = [c for c in candidates if c in counts and counts[c] >= min_cnt]
+        if border is not None:
+            for c in candidates:
+                if counts.get(c, 0) < min_cnt:
+                    border[c] = counts.get(c, 0)
+        for it in lk:
+            support = counts[it]/n
+            supports[it] = support
+            freq_itemsets.append((it, counts[it], support))
 
-        candidates = pruned_candidates
+        if engine == 'vertical':
+            prev_bits = {c: bits[c] for c in lk}
+        if stats is not None:
+            stats.append({'level': k, 'candidates': len(candidates),
+                          'frequent': len(lk),
+                          'seconds': time.perf_counter() - started})
 
-        counts = {}
+        lk_1 = lk
+        k += 1
+
+    return freq_itemsets, supports
+
+class FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def build_fp_tree(paths, order):
+    # paths are (items, weight) pairs already filtered to frequent items;
+    # `order` ranks items by descending support so shared prefixes collapse
+    root = FPNode(None, None)
+    header = {}
+    for items, weight in paths:
+        node = root
+        for it in sorted(items, key=order.__getitem__):
+            child = node.children.get(it)
+            if child is None:
+                child = FPNode(it, node)
+                node.children[it] = child
+                header.setdefault(it, []).append(child)
+            child.count += weight
+            node = child
+    return header
+
+
+def mine_fp_tree(header, order, suffix, min_cnt, found):
+    # least frequent items first, each one turning into a conditional tree
+    for it in sorted(header, key=order.__getitem__, reverse=True):
+        nodes = header[it]
+        itemset = suffix | frozenset([it])
+        found[itemset] = sum(node.count for node in nodes)
+
+        base = []
+        cond_cnt = {}
+        for node in nodes:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                base.append((path, node.count))
+                for p in path:
+                    cond_cnt[p] = cond_cnt.get(p, 0) + node.count
+
+        keep = {p for p, cnt in cond_cnt.items() if cnt >= min_cnt}
+        if not keep:
+            continue
+        cond_paths = []
+        for path, weight in base:
+            path = [p for p in path if p in keep]
+            if path:
+                cond_paths.append((path, weight))
+        cond_header = build_fp_tree(cond_paths, order)
+        mine_fp_tree(cond_header, order, itemset, min_cnt, found)
+
+
+def fpgrowth(transactions, min_support):
+    if not (0 < min_support <= 1):
+        raise ValueError("min_support must be between 0 and 1")
+
+    n = len(transactions)
+    min_cnt = max(1, (int)(min_support*n))
+
+    # pass 1: item counts, same as apriori()
+    item_cnt = {}
+    for t in transactions:
+        for it in dict.fromkeys(t):
+            if it not in item_cnt:
+                item_cnt[it] = 1
+            else:
+                item_cnt[it] += 1
+
+    frequent = [it for it, cnt in item_cnt.items() if cnt >= min_cnt]
+    ranked = sorted(range(len(frequent)),
+                    key=lambda i: (-item_cnt[frequent[i]], i))
+    order = {frequent[i]: r for r, i in enumerate(ranked)}
+
+    # pass 2: insert each transaction's frequent items into the tree
+    def paths():
         for t in transactions:
-            tset = frozenset(t)
-            for c in candidates:
-                if c.issubset(tset):
-                    if c not in counts:
-                        counts[c] = 1
-                    else:
-                        counts[c] += 1
+            items = {it for it in t if it in order}
+            if items:
+                yield items, 1
 
-        lk = [c for c in candidates if c in counts and counts[c] >= min_cnt]
+    header = build_fp_tree(paths(), order)
+    found = {}
+    mine_fp_tree(header, order, frozenset(), min_cnt, found)
+
+    supports = {}
+    freq_itemsets = []
+    for itemset in sorted(found, key=lambda s: (len(s), sorted(order[it] for it in s))):
+        cnt = found[itemset]
+        support = cnt/n
+        supports[itemset] = support
+        freq_itemsets.append((itemset, cnt, support))
+
+    return freq_itemsets, supports
+
+
+def mine_partition(partition, min_support, engine):
+    freq_itemsets, _ = apriori(partition, min_support, engine=engine)
+    return [itemset for itemset, _, _ in freq_itemsets]
+
+
+def count_partition(partition, candidates):
+    # singletons are counted per transaction, like apriori(); larger itemsets
+    # through the same packed bitsets as the vertical engine
+    singles = {next(iter(c)) for c in candidates if len(c) == 1}
+    item_cnt = {}
+    for t in partition:
+        for it in dict.fromkeys(t):
+            if it in singles:
+                item_cnt[it] = item_cnt.get(it, 0) + 1
+
+    wanted = set()
+    for c in candidates:
+        if len(c) > 1:
+            wanted |= c
+    item_bits = build_item_bitsets(partition, wanted)
+
+    counts = {frozenset([it]): cnt for it, cnt in item_cnt.items()}
+    for c in candidates:
+        if len(c) > 1:
+            items = iter(c)
+            b = item_bits[next(items)]
+            for it in items:
+                b &= item_bits[it]
+            counts[c] = b.bit_count()
+    return counts
+
+
+def apriori_son(transactions, min_support, workers=None, partitions=None,
+                engine='vertical'):
+    # Savasere-Omiecinski-Navathe: an itemset that is frequent overall is
+    # frequent in at least one partition at the same relative threshold, so
+    # the union of the local results is a complete candidate set
+    if not (0 < min_support <= 1):
+        raise ValueError("min_support must be between 0 and 1")
+
+    n = len(transactions)
+    min_cnt = max(1, (int)(min_support*n))
+    workers = workers or os.cpu_count() or 1
+    partitions = max(1, min(partitions or workers, n))
+    bounds = [n * i // partitions for i in range(partitions + 1)]
+    parts = [transactions[bounds[i]:bounds[i+1]] for i in range(partitions)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # phase 1: local frequent itemsets
+        candidates = set()
+        for local in pool.map(mine_partition, parts,
+                              [min_support] * partitions,
+                              [engine] * partitions):
+            candidates.update(local)
+        candidates = list(candidates)
+
+        # phase 2: one global counting pass over every partition
+        counts = {}
+        for local in pool.map(count_partition, parts,
+                              [candidates] * partitions):
+            for c, cnt in local.items():
+                counts[c] = counts.get(c, 0) + cnt
+
+    # replay apriori's level order over the global counts so the output is
+    # identical, order included, to the serial miners
+    l1 = [c for c, cnt in counts.items() if len(c) == 1 and cnt >= min_cnt]
+    supports = {}
+    freq_itemsets = []
+    k = 1
+    lk = l1
+    while lk:
         for it in lk:
             support = counts[it]/n
             supports[it] = support
             freq_itemsets.append((it, counts[it], support))
-
-        lk_1 = lk
         k += 1
+        lk = [c for c in generate_candidates(lk, k)
+              if counts.get(c, 0) >= min_cnt]
 
     return freq_itemsets, supports
 
-def get_association_rules(freq_itemsets, min_confidence, transactions):
-    rules = []
+
+MINERS = {'apriori': apriori, 'fpgrowth': fpgrowth, 'son': apriori_son}
+
+
+def frequent_item_bitsets(transactions, min_cnt):
+    # per-transaction support of every item, as packed tid bitsets
+    item_cnt = {}
+    for t in transactions:
+        for it in t:
+            item_cnt[it] = item_cnt.get(it, 0) + 1
+    item_bits = build_item_bitsets(
+        transactions, [it for it, cnt in item_cnt.items() if cnt >= min_cnt])
+    return [(it, b) for it, b in item_bits.items() if b.bit_count() >= min_cnt]
+
+
+def charm_extend(nodes, min_cnt, closed):
+    # CHARM over (itemset, tidset) nodes: equal tidsets merge, a contained
+    # tidset absorbs its sibling, so non-closed branches are never expanded
+    i = 0
+    while i < len(nodes):
+        x, tx = nodes[i]
+        children = []
+        j = i + 1
+        while j < len(nodes):
+            y, ty = nodes[j]
+            t = tx & ty
+            if t.bit_count() < min_cnt:
+                j += 1
+                continue
+            if t == tx:
+                x = x | y
+                children = [(z | y, tz) for z, tz in children]
+                if t == ty:
+                    nodes.pop(j)
+                    continue
+            elif t == ty:
+                nodes.pop(j)
+                children.append((x | y, t))
+                continue
+            else:
+                children.append((x | y, t))
+            j += 1
+
+        if children:
+            children.sort(key=lambda node: node[1].bit_count())
+            charm_extend(children, min_cnt, closed)
+        # an itemset's closure is unique per tidset, so merging by tidset
+        # drops anything subsumed by a closed superset of equal support
+        closed[tx] = closed[tx] | x if tx in closed else x
+        i += 1
+
+
+def mine_closed(transactions, min_support):
+    if not (0 < min_support <= 1):
+        raise ValueError("min_support must be between 0 and 1")
+
+    n = len(transactions)
+    min_cnt = max(1, (int)(min_support*n))
+    nodes = [(frozenset([it]), b)
+             for it, b in frequent_item_bitsets(transactions, min_cnt)]
+    nodes.sort(key=lambda node: node[1].bit_count())
+    closed = {}
+    charm_extend(nodes, min_cnt, closed)
+
+    supports = {}
+    freq_itemsets = []
+    for bits, itemset in sorted(closed.items(), key=lambda e: (len(e[1]), sorted(e[1]))):
+        cnt = bits.bit_count()
+        supports[itemset] = cnt/n
+        freq_itemsets.append((itemset, cnt, cnt/n))
+    return freq_itemsets, supports
+
+
+def mafia_extend(head, head_bits, tail, min_cnt, maximal):
+    # head-union-tail already inside a known maximal itemset: nothing new here
+    whole = head.union(it for it, _ in tail)
+    for m in maximal:
+        if whole <= m:
+            return
+
+    # parent equivalence: items present wherever the head is join the head
+    head_cnt = head_bits.bit_count()
+    rest = []
+    for it, b in tail:
+        joined = head_bits & b
+        cnt = joined.bit_count()
+        if cnt == head_cnt:
+            head = head | frozenset([it])
+        elif cnt >= min_cnt:
+            rest.append((it, b, cnt))
+
+    if not rest:
+        if not any(head <= m for m in maximal):
+            maximal[head] = head_cnt
+        return
+
+    rest.sort(key=lambda e: e[2])
+    for i, (it, b, _) in enumerate(rest):
+        mafia_extend(head | frozenset([it]), head_bits & b,
+                     [(it2, b2) for it2, b2, _ in rest[i+1:]], min_cnt, maximal)
+    if not any(head <= m for m in maximal):
+        maximal[head] = head_cnt
+
+
+def mine_maximal(transactions, min_support):
+    if not (0 < min_support <= 1):
+        raise ValueError("min_support must be between 0 and 1")
+
     n = len(transactions)
+    min_cnt = max(1, (int)(min_support*n))
+    items = frequent_item_bitsets(transactions, min_cnt)
+    items.sort(key=lambda e: e[1].bit_count())
+    maximal = {}
+    all_tids = (1 << n) - 1
+    mafia_extend(frozenset(), all_tids, items, min_cnt, maximal)
+    maximal.pop(frozenset(), None)
+
+    supports = {}
+    freq_itemsets = []
+    for itemset in sorted(maximal, key=lambda s: (len(s), sorted(s))):
+        cnt = maximal[itemset]
+        supports[itemset] = cnt/n
+        freq_itemsets.append((itemset, cnt, cnt/n))
+    return freq_itemsets, supports
+
+
+class ClosedLookup(dict):
+    # count (or support, when n is given) of any frequent itemset, taken
+    # from its smallest closed superset, which is the one with highest count.
+    # Closed sets are kept in descending count order and indexed per item, so
+    # a lookup walks only the closed sets holding the itemset's rarest item
+    # and stops at the first one that contains the whole itemset.
+    def __init__(self, closed_itemsets, n=None):
+        super().__init__()
+        self.closed = sorted(((itemset, count) for itemset, count, _ in closed_itemsets),
+                             key=lambda sc: -sc[1])
+        self.by_item = {}
+        for pos, (itemset, _) in enumerate(self.closed):
+            for item in itemset:
+                self.by_item.setdefault(item, []).append(pos)
+        self.n = n
+
+    def __missing__(self, itemset):
+        if itemset:
+            postings = [self.by_item.get(item, ()) for item in itemset]
+            candidates = min(postings, key=len)
+        else:
+            candidates = range(len(self.closed))
+        count = 0
+        for pos in candidates:
+            s, c = self.closed[pos]
+            if itemset <= s:
+                count = c
+                break
+        value = count/self.n if self.n else count
+        self[itemset] = value
+        return value
+
+
+def expand_closed(closed_itemsets, n):
+    # every frequent itemset lies inside a closed one and shares the count of
+    # its smallest closed superset, so the full table is rebuilt level by
+    # level from the lookup without another pass over the transactions
+    counts = ClosedLookup(closed_itemsets)
+    items = set()
+    for itemset, _, _ in closed_itemsets:
+        items |= itemset
+    supports = {}
+    freq_itemsets = []
+    lk = [frozenset([it]) for it in sorted(items)]
+    k = 1
+    while lk:
+        for itemset in lk:
+            supports[itemset] = counts[itemset]/n
+            freq_itemsets.append((itemset, counts[itemset], supports[itemset]))
+        k += 1
+        lk = [c for c in generate_candidates(lk, k) if counts[c]]
+    return freq_itemsets, supports
+
+
+OUTPUT_MODES = {'all': None, 'closed': mine_closed, 'maximal': mine_maximal}
+
+
+def apriori_state(n, min_support, freq_itemsets, border):
+    # everything an incremental update needs: the frequent itemsets and the
+    # negative border, each with its absolute count
+    counts = {itemset: count for itemset, count, _ in freq_itemsets}
+    counts.update(border)
+    return {'n': n, 'min_support': min_support, 'counts': counts}
+
+
+def save_apriori_state(filename, state, names=None):
+    itemsets = []
+    for itemset, count in state['counts'].items():
+        items = [names[it] for it in itemset] if names is not None else list(itemset)
+        itemsets.append([sorted(items), count])
+    # written aside and renamed so a crash never leaves a truncated state
+    tmp = filename + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'n': state['n'], 'min_support': state['min_support'],
+                   'itemsets': itemsets}, f)
+    os.replace(tmp, filename)
+
+
+def load_apriori_state(filename):
+    with open(filename, encoding='utf-8') as f:
+        raw = json.load(f)
+    counts = {frozenset(items): count for items, count in raw['itemsets']}
+    return {'n': raw['n'], 'min_support': raw['min_support'], 'counts': counts}
+
+
+def update_apriori(state, delta, history=None):
+    # FUP-style update: one pass over the delta refreshes every tracked count.
+    # An untracked itemset has an infrequent subset in the old border, so it
+    # can only become frequent once that border itemset does; only then are
+    # the old transactions (`history`) rescanned for the new candidates.
+    # Several levels may need a rescan, so history must be re-iterable; a
+    # one-shot iterator is materialised rather than silently exhausted.
+    delta = list(delta)
+    if history is not None and iter(history) is history:
+        history = list(history)
+    min_support = state['min_support']
+    tracked = state['counts']
+    n = state['n'] + len(delta)
+    min_cnt = max(1, (int)(min_support*n))
+
+    item_delta, set_delta = count_itemsets(delta, tracked)
+    counts = {}
+    for itemset, count in tracked.items():
+        if len(itemset) == 1:
+            counts[itemset] = count + item_delta.get(next(iter(itemset)), 0)
+        else:
+            counts[itemset] = count + set_delta.get(itemset, 0)
+    for it, count in item_delta.items():
+        counts.setdefault(frozenset([it]), count)
+
+    singles = [c for c in counts if len(c) == 1]
+    border = {c: counts[c] for c in singles if counts[c] < min_cnt}
+    lk = [c for c in singles if counts[c] >= min_cnt]
+    supports = {}
+    freq_itemsets = []
+    rescans = 0
+    k = 1
+    while lk:
+        for it in lk:
+            support = counts[it]/n
+            supports[it] = support
+            freq_itemsets.append((it, counts[it], support))
+        k += 1
+        candidates = generate_candidates(lk, k)
+        missing = [c for c in candidates if c not in counts]
+        if missing:
+            if history is None:
+                raise ValueError(
+                    "A border itemset became frequent; history is required to rescan.")
+            found = count_horizontal(chain(history, delta), missing)
+            for c in missing:
+                counts[c] = found.get(c, 0)
+            rescans += 1
+        lk = [c for c in candidates if counts[c] >= min_cnt]
+        for c in candidates:
+            if counts[c] < min_cnt:
+                border[c] = counts[c]
+
+    new_state = apriori_state(n, min_support, freq_itemsets, border)
+    new_state['rescans'] = rescans
+    return freq_itemsets, supports, new_state
+
+
+def rule_metrics(count, antecedent_count, support, antecedent_support,
+                 consequent_support):
+    confidence = count / antecedent_count
+    lift = confidence / consequent_support
+    leverage = support - antecedent_support * consequent_support
+    if confidence >= 1:
+        conviction = float('inf')
+    else:
+        conviction = (1 - consequent_support) / (1 - confidence)
+    return confidence, lift, leverage, conviction
+
+
+def get_association_rules(freq_itemsets, min_confidence, supports):
+    # everything comes from the mined table: by downward closure every
+    # antecedent and consequent of a frequent itemset is itself frequent.
+    # Closed itemsets are not downward closed; expand_closed them first.
+    counts = {itemset: count for itemset, count, _ in freq_itemsets}
+    rules = []
     for itemset, count, support in freq_itemsets:
-        if len(itemset) > 1:
-            items = list(itemset)
-            for r in range(1, len(items)):
-                from itertools import combinations
-                for combo in combinations(items, r):
-                    antecedent = frozenset(combo)
-                    consequent = itemset - antecedent
-                    if not consequent:
-                        continue
-                    antecedent_count = sum(1 for t in transactions if antecedent.issubset(frozenset(t)))
-                    if antecedent_count == 0:
-                        continue
-                    confidence = count / antecedent_count
-                    if confidence >= min_confidence:
-                        rules.append((antecedent, consequent, confidence))
+        if len(itemset) < 2:
+            continue
+
+        # level-wise over consequent size; confidence can only drop as the
+        # consequent grows, so only consequents that passed are extended
+        level = [frozenset([it]) for it in sorted(itemset)]
+        m = 1
+        while level and m < len(itemset):
+            passed = []
+            for consequent in level:
+                antecedent = itemset - consequent
+                confidence, lift, leverage, conviction = rule_metrics(
+                    count, counts[antecedent], support,
+                    supports[antecedent], supports[consequent])
+                if confidence >= min_confidence:
+                    passed.append(consequent)
+                    rules.append((antecedent, consequent, confidence,
+                                  lift, leverage, conviction))
+            m += 1
+            level = generate_candidates(passed, m)
+            level.sort(key=sorted)
     return rules
 
 
-def main():
-    rows = read_csv_rows('data.csv')
-    transactions = parse_data(rows)
+STATE_PATH = 'apriori_state.json'
+
+
+def run_incremental(delta_path, min_confidence, history_path='data.csv',
+                    state_path=STATE_PATH, itemsets_out='frequent_itemsets.csv',
+                    rules_out='association_rules.csv'):
+    # the state describes exactly the transactions in history_path; history
+    # is only read if a rescan is needed, and the delta rows are appended
+    # before the new state is saved so the two never describe different data
+    state = load_apriori_state(state_path)
+    delta_rows = read_csv_rows(delta_path)
+    delta = parse_data(delta_rows)
+
+    freq_itemsets, supports, state = update_apriori(
+        state, delta, TransactionsFile(history_path))
+    with open(history_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerows(delta_rows)
+    save_apriori_state(state_path, state)
+    write_frequent_itemsets(itemsets_out, freq_itemsets)
+    rules = get_association_rules(freq_itemsets, min_confidence, supports)
+    write_association_rules(rules_out, rules)
+
+    print(f"Added {len(delta)} transactions ({state['n']} total), "
+          f"{state['rescans']} history rescans.")
+    print(f"Total frequent itemsets found: {len(freq_itemsets)}")
+    print(f"Total rules found: {len(rules)}")
+    return freq_itemsets, rules
+
+
+def filter_itemsets(freq_itemsets, n, min_support):
+    # an itemset is frequent at a threshold exactly when its count reaches
+    # it, so a higher threshold is a filter over a lower threshold's result
+    min_cnt = max(1, (int)(min_support*n))
+    kept = [(itemset, count, support) for itemset, count, support in freq_itemsets
+            if count >= min_cnt]
+    supports = {itemset: support for itemset, _, support in kept}
+    return kept, supports
+
+
+def mine_sweep(transactions, min_supports, miner='apriori', stats=None,
+               mode='all', **options):
+    # mine once at the lowest threshold and derive the others by filtering;
+    # closedness does not depend on the threshold, maximality does
+    if miner not in MINERS:
+        raise ValueError(f"miner must be one of {tuple(MINERS)}")
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"mode must be one of {tuple(OUTPUT_MODES)}")
+    if mode == 'maximal':
+        return [(min_support,) + mine_maximal(transactions, min_support)
+                for min_support in min_supports]
+    if mode == 'closed':
+        miner_fn, options = mine_closed, {}
+    else:
+        miner_fn = MINERS[miner]
+    if stats is not None:
+        if miner != 'apriori' or mode != 'all':
+            raise ValueError("per-level stats are only recorded by apriori")
+        options['stats'] = stats
+    lowest = min(min_supports)
+    freq_itemsets, supports = miner_fn(transactions, lowest, **options)
+
+    n = len(transactions)
+    results = []
+    for min_support in min_supports:
+        if min_support == lowest:
+            results.append((min_support, freq_itemsets, supports))
+        else:
+            results.append((min_support,) + filter_itemsets(freq_itemsets, n, min_support))
+    return results
+
+
+def sweep_filename(filename, min_support, sweeping):
+    if not sweeping:
+        return filename
+    root, ext = os.path.splitext(filename)
+    return f"{root}_s{min_support:g}{ext}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mine frequent itemsets and association rules from a transactions CSV.")
+    parser.add_argument('input', nargs='?', default='data.csv',
+                        help="transactions CSV (default: data.csv)")
+    parser.add_argument('-s', '--min-support', type=float, nargs='+',
+                        help="one or more minimum supports (0-1); several values run a sweep")
+    parser.add_argument('-c', '--min-confidence', type=float,
+                        help="minimum rule confidence (0-1); rules are skipped when omitted")
+    parser.add_argument('--miner', choices=list(MINERS), default='apriori')
+    parser.add_argument('--mode', choices=list(OUTPUT_MODES), default='all',
+                        help="list all, closed or maximal frequent itemsets")
+    parser.add_argument('--engine', choices=COUNTING_ENGINES, default='horizontal',
+                        help="support counting engine for apriori and son")
+    parser.add_argument('--workers', type=int,
+                        help="worker processes for the son miner")
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help="rows read per chunk while ingesting")
+    parser.add_argument('--itemsets-out', default='frequent_itemsets.csv')
+    parser.add_argument('--rules-out', default='association_rules.csv')
+    parser.add_argument('--stats-json',
+                        help="write per-level timing and candidate counts as JSON ('-' for stdout)")
+    parser.add_argument('--state', default=None,
+                        help="save apriori state here for later incremental updates")
+    parser.add_argument('--delta',
+                        help="update the saved state with this CSV of new transactions")
+    return parser.parse_args(argv)
+
+
+def run_batch(args):
+    transactions = ingest_transactions(args.input, args.chunk_size)
+    names = transactions.names
+    n = len(transactions)
+
+    options = {}
+    if args.miner in ('apriori', 'son'):
+        options['engine'] = args.engine
+    if args.miner == 'son' and args.workers:
+        options['workers'] = args.workers
+    plain_apriori = args.miner == 'apriori' and args.mode == 'all'
+    if args.state and not plain_apriori:
+        raise SystemExit("--state is only saved by --miner apriori with --mode all.")
+    if args.mode != 'all':
+        options = {}
+    levels = [] if plain_apriori else None
+    border = {} if args.state and plain_apriori else None
+    if border is not None:
+        options['border'] = border
+
+    started = time.perf_counter()
+    results = mine_sweep(transactions, args.min_support, args.miner,
+                         stats=levels, mode=args.mode, **options)
+    report = {'input': args.input, 'transactions': n, 'miner': args.miner,
+              'mode': args.mode,
+              'mine_seconds': time.perf_counter() - started,
+              'levels': levels, 'thresholds': []}
+
+    if border is not None:
+        lowest_support, lowest_itemsets, _ = min(results, key=lambda r: r[0])
+        save_apriori_state(args.state, apriori_state(
+            n, lowest_support, lowest_itemsets, border), names)
+
+    sweeping = len(args.min_support) > 1
+    for min_support, freq_itemsets, supports in results:
+        entry = {'min_support': min_support, 'itemsets': len(freq_itemsets)}
+        write_frequent_itemsets(
+            sweep_filename(args.itemsets_out, min_support, sweeping),
+            freq_itemsets, names)
+        if args.min_confidence is not None and args.mode != 'maximal':
+            rules_started = time.perf_counter()
+            rule_itemsets = freq_itemsets
+            if args.mode == 'closed':
+                rule_itemsets, supports = expand_closed(freq_itemsets, n)
+            rules = get_association_rules(rule_itemsets, args.min_confidence, supports)
+            entry['rules'] = len(rules)
+            entry['rules_seconds'] = time.perf_counter() - rules_started
+            write_association_rules(
+                sweep_filename(args.rules_out, min_support, sweeping),
+                rules, names)
+        report['thresholds'].append(entry)
+        print(f"min_support={min_support:g}: {entry['itemsets']} frequent itemsets"
+              + (f", {entry['rules']} rules" if 'rules' in entry else ''),
+              file=sys.stderr)
+
+    if args.stats_json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return results
+
+
+def interactive_main():
+    transactions = ingest_transactions('data.csv')
+    names = transactions.names
 
     print("Parsed Transactions: ")
-    for transaction in transactions[0:5]:
-        print(transaction)
+    for transaction in islice(transactions, 5):
+        print(transactions.decode(transaction))
     print("...")
 
     min_support = float(input("Enter minimum support (0-1): "))
-    freq_itemsets, supports = apriori(transactions, min_support)
+    border = {}
+    freq_itemsets, supports = apriori(transactions, min_support, border=border)
+    save_apriori_state(STATE_PATH, apriori_state(
+        len(transactions), min_support, freq_itemsets, border), names)
 
     print("\nFrequent Itemsets:")
     for itemset, count, support in freq_itemsets:
         print(
-            f"Itemset: {set(itemset)}, Count: {count}, Support: {support:.4f}")
+            f"Itemset: {set(transactions.decode(itemset))}, Count: {count}, Support: {support:.4f}")
 
     # write frequent itemsets to CSV
-    with open('frequent_itemsets.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['itemset', 'count', 'support'])
-        for itemset, count, support in freq_itemsets:
-            itemset_str = '{' + ','.join(sorted(list(itemset))) + '}'
-            writer.writerow([itemset_str, count, f"{support:.6f}"])
+    write_frequent_itemsets('frequent_itemsets.csv', freq_itemsets, names)
 
     if not freq_itemsets:
         print("No frequent itemsets found with the given minimum support.")
@@ -142,25 +1038,34 @@ def main():
         print(f"Total frequent itemsets found: {len(freq_itemsets)}\n")
 
     min_confidence = float(input("Enter minimum confidence (0-1): "))
-    rules = get_association_rules(freq_itemsets, min_confidence, transactions)
+    rules = get_association_rules(freq_itemsets, min_confidence, supports)
     print("\nAssociation Rules:")
-    for antecedent, consequent, confidence in rules:
-        print(f"Rule: {set(antecedent)} -> {set(consequent)}, "
-              f"Confidence: {confidence:.4f}")
+    for antecedent, consequent, confidence, lift, leverage, conviction in rules:
+        print(f"Rule: {set(transactions.decode(antecedent))} -> "
+              f"{set(transactions.decode(consequent))}, "
+              f"Confidence: {confidence:.4f}, Lift: {lift:.4f}, "
+              f"Leverage: {leverage:.4f}, Conviction: {conviction:.4f}")
 
     # write association rules to CSV
-    with open('association_rules.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['antecedent', 'consequent', 'confidence'])
-        for antecedent, consequent, confidence in rules:
-            ant_str = '{' + ','.join(sorted(list(antecedent))) + '}'
-            cons_str = '{' + ','.join(sorted(list(consequent))) + '}'
-            writer.writerow([ant_str, cons_str, f"{confidence:.6f}"])
+    write_association_rules('association_rules.csv', rules, names)
     if not rules:
         print("No association rules found with the given minimum confidence.")
     else:
         print(f"Total rules found: {len(rules)}")
 
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.delta:
+        if args.min_confidence is None:
+            raise SystemExit("--delta needs --min-confidence.")
+        run_incremental(args.delta, args.min_confidence, args.input,
+                        args.state or STATE_PATH, args.itemsets_out, args.rules_out)
+    elif args.min_support is None:
+        interactive_main()
+    else:
+        run_batch(args)
+
+
 if __name__ == "__main__":
     main()
@@ -1,25 +1,123 @@
+import argparse
 import csv
 import itertools
 import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from distance import METRICS, as_matrix, point_to_set
 
 DATA_PATH = "data.csv"
 OUT_PATH = "dbscan.csv"
 
+INDEXES = ("auto", "grid", "kdtree", "brute")
+# the eps-grid visits 3^d cells per query, so past this it loses to a KD-tree
+GRID_MAX_DIMS = 3
+KD_LEAF_SIZE = 16
+
+
+def region_query(rows, point_idx, eps, metric="euclidean", p=2):
+    ds = point_to_set(rows[point_idx], rows, metric, p)
+    return [j for j, d in enumerate(ds) if d <= eps]
+
+
+def coords(rows):
+    return rows.tolist() if hasattr(rows, "tolist") else rows
+
+
+def filter_candidates(rows, point_idx, candidates, eps, metric, p):
+    # exact check through the same kernel as region_query, in index order so
+    # the seeds grow exactly as they do on the brute-force path
+    candidates.sort()
+    ds = point_to_set(rows[point_idx], rows, metric, p, indices=candidates)
+    return [j for j, d in zip(candidates, ds) if d <= eps]
+
+
+class EpsGrid:
+    # uniform grid with eps-wide cells: for any minkowski metric (p >= 1) a
+    # point within eps differs by at most eps per coordinate, so every
+    # neighbour lies in the 3^d cells around the query point's cell
+    def __init__(self, rows, eps):
+        self.eps = eps
+        self.cells = [tuple(math.floor(v / eps) for v in x) for x in coords(rows)]
+        self.buckets = {}
+        for i, cell in enumerate(self.cells):
+            self.buckets.setdefault(cell, []).append(i)
+        d = len(self.cells[0]) if self.cells else 0
+        self.offsets = list(itertools.product((-1, 0, 1), repeat=d))
 
-def dist(a, b):
-    return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+    def candidates(self, point_idx):
+        cell = self.cells[point_idx]
+        out = []
+        for off in self.offsets:
+            out += self.buckets.get(tuple(c + o for c, o in zip(cell, off)), ())
+        return out
 
 
-def region_query(rows, point_idx, eps):
-    p = rows[point_idx]
-    neighbors = []
-    for j, q in enumerate(rows):
-        if dist(p, q) <= eps:
-            neighbors.append(j)
-    return neighbors
+class KDTree:
+    # median-split KD-tree on the widest axis; a subtree is skipped when the
+    # query's eps-box does not reach its side of the split
+    def __init__(self, rows, leaf_size=KD_LEAF_SIZE):
+        self.points = coords(rows)
+        self.leaf_size = leaf_size
+        self.root = self.build(list(range(len(self.points))))
 
+    def build(self, idx):
+        if len(idx) <= self.leaf_size:
+            return idx
+        pts = self.points
+        d = len(pts[idx[0]])
+        axis = max(range(d), key=lambda a: max(pts[i][a] for i in idx) - min(pts[i][a] for i in idx))
+        idx.sort(key=lambda i: pts[i][axis])
+        mid = len(idx) // 2
+        split = pts[idx[mid]][axis]
+        return (axis, split, self.build(idx[:mid]), self.build(idx[mid:]))
 
-def dbscan(rows, eps, min_samples):
+    def candidates(self, point_idx, eps):
+        x = self.points[point_idx]
+        out = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                out += node
+                continue
+            axis, split, left, right = node
+            if x[axis] - eps <= split:
+                stack.append(left)
+            if x[axis] + eps >= split:
+                stack.append(right)
+        return out
+
+
+def choose_index(rows, metric, index="auto"):
+    if index not in INDEXES:
+        raise ValueError(f"unknown index {index!r}, expected one of {INDEXES}")
+    if index != "auto":
+        if index != "brute" and metric == "cosine":
+            raise ValueError("the grid and KD-tree bound coordinates, which cosine distance does not")
+        return index
+    if metric == "cosine" or len(rows) == 0:
+        return "brute"
+    return "grid" if len(rows[0]) <= GRID_MAX_DIMS else "kdtree"
+
+
+def neighbourhood_query(rows, eps, metric="euclidean", p=2, index="auto"):
+    # builds the spatial index once and returns point_idx -> sorted neighbours
+    index = choose_index(rows, metric, index)
+    if index == "grid":
+        grid = EpsGrid(rows, eps)
+        return lambda i: filter_candidates(rows, i, grid.candidates(i), eps, metric, p)
+    if index == "kdtree":
+        tree = KDTree(rows)
+        return lambda i: filter_candidates(rows, i, tree.candidates(i, eps), eps, metric, p)
+    return lambda i: region_query(rows, i, eps, metric, p)
+
+
+def dbscan(rows, eps, min_samples, metric="euclidean", p=2, index="auto"):
+    rows = as_matrix(rows)
+    query = neighbourhood_query(rows, eps, metric, p, index)
     n = len(rows)
     labels = [None] * n
     cluster_id = 0
@@ -28,23 +126,25 @@ def dbscan(rows, eps, min_samples):
         if labels[i] is not None:
             continue
 
-        neighbors = region_query(rows, i, eps)
+        neighbors = query(i)
         if len(neighbors) < min_samples:
             labels[i] = -1
             continue
 
         labels[i] = cluster_id
         seeds = neighbors.copy()
+        in_seeds = set(seeds)
         k = 0
         while k < len(seeds):
             j = seeds[k]
             if labels[j] is None:
                 labels[j] = cluster_id
-                j_neighbors = region_query(rows, j, eps)
+                j_neighbors = query(j)
                 if len(j_neighbors) >= min_samples:
                     for nb in j_neighbors:
-                        if nb not in seeds:
+                        if nb not in in_seeds:
                             seeds.append(nb)
+                            in_seeds.add(nb)
             elif labels[j] == -1:
                 labels[j] = cluster_id
             k += 1
@@ -54,7 +154,20 @@ def dbscan(rows, eps, min_samples):
     return labels
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DBSCAN clustering of a numeric CSV.")
+    parser.add_argument("--metric", choices=METRICS, default="euclidean",
+                        help="distance used for eps-neighbourhoods (default: euclidean)")
+    parser.add_argument("-p", type=float, default=2,
+                        help="order of the minkowski metric (default: 2)")
+    parser.add_argument("--index", choices=INDEXES, default="auto",
+                        help="region-query index: eps-grid for up to 3 dimensions, KD-tree "
+                             "above, brute force to verify (default: auto)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     with open(DATA_PATH, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         all_rows = [row for row in reader]
@@ -118,7 +231,7 @@ def main():
     if min_samples < 1:
         min_samples = 1
 
-    labels = dbscan(rows, eps, min_samples)
+    labels = dbscan(rows, eps, min_samples, args.metric, args.p, args.index)
 
     out_fieldnames = fieldnames[:]
     if "cluster" not in out_fieldnames:
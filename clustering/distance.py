@@ -0,0 +1,263 @@
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+METRICS = ("euclidean", "manhattan", "cosine", "minkowski")
+
+# set-to-set kernels work on row blocks sized so that no temporary holds more
+# than this many floats (32 MiB), however many points there are
+BLOCK_FLOATS = 1 << 22
+
+
+def check_metric(metric, p=2):
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric!r}, expected one of {METRICS}")
+    if metric == "minkowski" and p < 1:
+        raise ValueError("minkowski needs p >= 1")
+
+
+def dist(a, b, metric="euclidean", p=2):
+    if metric == "euclidean":
+        return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+    if metric == "manhattan":
+        return sum(abs(x - y) for x, y in zip(a, b))
+    if metric == "minkowski":
+        return sum(abs(x - y) ** p for x, y in zip(a, b)) ** (1.0 / p)
+    # cosine distance; a zero vector is treated as orthogonal to everything
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    if na == 0 or nb == 0:
+        return 1.0
+    return 1.0 - sum(x * y for x, y in zip(a, b)) / (na * nb)
+
+
+def as_matrix(rows):
+    # convert once up front; every kernel below accepts the result as-is
+    if np is None:
+        return rows
+    return np.asarray(rows, dtype=float)
+
+
+def _unit_rows(Y):
+    norms = np.sqrt((Y * Y).sum(axis=1))
+    zero = norms == 0
+    norms[zero] = 1.0
+    return Y / norms[:, None], zero
+
+
+def _to_point(x, Y, metric, p):
+    # direct differences: one point against a set, O(len(Y) * d) memory
+    if metric == "euclidean":
+        return np.sqrt(((Y - x) ** 2).sum(axis=1))
+    if metric == "manhattan":
+        return np.abs(Y - x).sum(axis=1)
+    if metric == "minkowski":
+        return (np.abs(Y - x) ** p).sum(axis=1) ** (1.0 / p)
+    Yn, zero = _unit_rows(Y)
+    nx = math.sqrt(float(x @ x))
+    if nx == 0:
+        return np.ones(len(Y))
+    out = 1.0 - Yn @ (x / nx)
+    out[zero] = 1.0
+    return out
+
+
+def point_to_set(x, Y, metric="euclidean", p=2, indices=None):
+    # distances from x to every row of Y (or of Y[indices]) as a list
+    if np is None:
+        Ys = Y if indices is None else [Y[i] for i in indices]
+        return [dist(x, y, metric, p) for y in Ys]
+    Y = np.asarray(Y, dtype=float)
+    if indices is not None:
+        Y = Y[indices]
+    return _to_point(np.asarray(x, dtype=float), Y, metric, p).tolist()
+
+
+def _block_rows(m, d, metric):
+    # euclidean and cosine only materialise rows x m; the others rows x m x d
+    per_row = m if metric in ("euclidean", "cosine") else m * max(d, 1)
+    return max(1, BLOCK_FLOATS // max(per_row, 1))
+
+
+def take(X, indices):
+    # rows of X at the given positions, in the same representation as X
+    if np is None:
+        return [X[i] for i in indices]
+    return np.asarray(X, dtype=float)[indices]
+
+
+def paired(X, Y, metric="euclidean", p=2):
+    # distance between X[i] and Y[i] for every i, as a list
+    if np is None:
+        return [dist(x, y, metric, p) for x, y in zip(X, Y)]
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    if metric == "euclidean":
+        out = np.sqrt(((X - Y) ** 2).sum(axis=1))
+    elif metric == "manhattan":
+        out = np.abs(X - Y).sum(axis=1)
+    elif metric == "minkowski":
+        out = (np.abs(X - Y) ** p).sum(axis=1) ** (1.0 / p)
+    else:
+        Xn, x_zero = _unit_rows(X)
+        Yn, y_zero = _unit_rows(Y)
+        out = 1.0 - (Xn * Yn).sum(axis=1)
+        out[x_zero | y_zero] = 1.0
+    return out.tolist()
+
+
+def _centred(X, Y):
+    # the expansion loses precision in proportion to the squared norms, so
+    # both sets are moved to Y's centroid first; distances are unchanged
+    shift = Y.mean(axis=0) if len(Y) else 0.0
+    return X - shift, Y - shift
+
+
+def _expansion_error(xx, yy_max, d):
+    # bound on the rounding error of ||a||^2 + ||b||^2 - 2ab in each entry
+    return (2 * d + 8) * 2.0 ** -52 * (xx + yy_max)
+
+
+def pairwise_blocks(X, Y=None, metric="euclidean", p=2, exact=False):
+    # yields (start, block) where block[i][j] is the distance between
+    # X[start + i] and Y[j]. Euclidean uses ||a||^2 + ||b||^2 - 2ab on
+    # centred data so each block is one matrix product; exact=True uses
+    # direct differences instead, for callers that publish the distances and
+    # want them to the last bit.
+    check_metric(metric, p)
+    if Y is None:
+        Y = X
+    if np is None:
+        for start, x in enumerate(X):
+            yield start, [[dist(x, y, metric, p) for y in Y]]
+        return
+
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    d = X.shape[1] if X.ndim == 2 else 0
+    if metric == "euclidean" and exact:
+        step = _block_rows(len(Y), d, "manhattan")
+    else:
+        step = _block_rows(len(Y), d, metric)
+    if metric == "euclidean" and not exact:
+        X, Y = _centred(X, Y)
+        yy = (Y * Y).sum(axis=1)
+    if metric == "cosine":
+        Yn, y_zero = _unit_rows(Y)
+
+    for start in range(0, len(X), step):
+        Xb = X[start:start + step]
+        if metric == "euclidean" and not exact:
+            D = (Xb * Xb).sum(axis=1)[:, None] + yy[None, :] - 2.0 * (Xb @ Y.T)
+            np.maximum(D, 0.0, out=D)
+            D = np.sqrt(D)
+        elif metric == "euclidean":
+            D = np.sqrt(((Xb[:, None, :] - Y[None, :, :]) ** 2).sum(axis=2))
+        elif metric == "manhattan":
+            D = np.abs(Xb[:, None, :] - Y[None, :, :]).sum(axis=2)
+        elif metric == "minkowski":
+            D = (np.abs(Xb[:, None, :] - Y[None, :, :]) ** p).sum(axis=2) ** (1.0 / p)
+        else:
+            Xn, x_zero = _unit_rows(Xb)
+            D = np.clip(1.0 - Xn @ Yn.T, 0.0, 2.0)
+            D[x_zero, :] = 1.0
+            D[:, y_zero] = 1.0
+        yield start, D
+
+
+def pairwise(X, Y=None, metric="euclidean", p=2, exact=False):
+    blocks = [D for _, D in pairwise_blocks(X, Y, metric, p, exact)]
+    if np is None:
+        return [row for D in blocks for row in D]
+    if not blocks:
+        return np.zeros((0, 0 if Y is None else len(Y)))
+    return np.vstack(blocks)
+
+
+def _two_smallest(D, labels, first, second):
+    if np is None:
+        for row in D:
+            m = min(row)
+            i = row.index(m)
+            labels.append(i)
+            first.append(m)
+            second.append(min(row[:i] + row[i + 1:], default=float("inf")))
+        return
+    idx = D.argmin(axis=1)
+    r = np.arange(len(idx))
+    labels += idx.tolist()
+    first += D[r, idx].tolist()
+    D[r, idx] = np.inf
+    second += (D.min(axis=1) if D.shape[1] else np.full(len(idx), np.inf)).tolist()
+
+
+def nearest_two(X, Y, metric="euclidean", p=2, exact=False):
+    # index of the (first) closest row of Y for every row of X, the distance
+    # to it and the distance to the runner-up (inf when Y has one row).
+    # exact=True keeps the euclidean matrix product but rechecks with direct
+    # differences every row whose two best candidates are within its rounding
+    # error, so labels and nearest distances match dist(); the runner-up is
+    # then a lower bound that is never above the true value.
+    labels, first, second = [], [], []
+    if np is None or metric != "euclidean" or not exact:
+        for _, D in pairwise_blocks(X, Y, metric, p):
+            _two_smallest(D, labels, first, second)
+        return labels, first, second
+
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    Xc, Yc = _centred(X, Y)
+    yy = (Yc * Yc).sum(axis=1)
+    yy_max = yy.max() if len(yy) else 0.0
+    step = _block_rows(len(Y), X.shape[1], metric)
+    for start in range(0, len(X), step):
+        Xb = Xc[start:start + step]
+        xx = (Xb * Xb).sum(axis=1)
+        D = xx[:, None] + yy[None, :] - 2.0 * (Xb @ Yc.T)
+        tol = _expansion_error(xx, yy_max, X.shape[1])
+        idx = D.argmin(axis=1)
+        r = np.arange(len(idx))
+        best = D[r, idx]
+        D[r, idx] = np.inf
+        runner = D.min(axis=1) if D.shape[1] else np.full(len(idx), np.inf)
+        close = np.nonzero(runner - best <= 2 * tol)[0]
+
+        rows = X[start:start + step]
+        near = np.sqrt(((rows - Y[idx]) ** 2).sum(axis=1))
+        below = np.sqrt(np.maximum(runner - tol, 0.0))
+        if len(close):
+            c_labels, c_first, c_second = [], [], []
+            for _, E in pairwise_blocks(rows[close], Y, metric, p, exact=True):
+                _two_smallest(E, c_labels, c_first, c_second)
+            idx[close] = c_labels
+            near[close] = c_first
+            below[close] = c_second
+        labels += idx.tolist()
+        first += near.tolist()
+        second += below.tolist()
+    return labels, first, second
+
+
+def nearest(X, Y, metric="euclidean", p=2, exact=False):
+    # index of (first) closest row of Y for every row of X, with the distance;
+    # exact=True guarantees the labels and distances dist() would give
+    labels, dists, _ = nearest_two(X, Y, metric, p, exact)
+    return labels, dists
+
+
+def condensed(X, metric="euclidean", p=2):
+    # upper triangle of the pairwise matrix, row by row, as array('d');
+    # computed with exact differences since callers write these distances out
+    out = array("d")
+    for start, D in pairwise_blocks(X, None, metric, p, exact=True):
+        for r in range(len(D)):
+            i = start + r
+            if np is None:
+                out.extend(D[r][i + 1:])
+            else:
+                out.frombytes(D[r, i + 1:].tobytes())
+    return out
@@ -0,0 +1,326 @@
+import argparse
+import os
+import sys
+from array import array
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from distance import METRICS, as_matrix, condensed, pairwise, point_to_set
+
+LINKAGES = ("single", "complete", "average")
+
+
+def condensed_index(n, i, j):
+    # position of pair (i, j), i < j, in the upper-triangle condensed matrix
+    return n * i - i * (i + 1) // 2 + j - i - 1
+
+
+def lance_williams(method, d_ik, d_jk, n_i, n_j):
+    if method == "single":
+        return min(d_ik, d_jk)
+    if method == "complete":
+        return max(d_ik, d_jk)
+    return (n_i * d_ik + n_j * d_jk) / (n_i + n_j)
+
+
+def nn_chain(rows, method, metric="euclidean", p=2):
+    # Nearest-neighbour chain over a condensed matrix with Lance-Williams
+    # updates. Single, complete and average linkage are reducible, so every
+    # reciprocal nearest-neighbour pair found on the chain is a merge of the
+    # greedy algorithm; the merges come out unordered and linkage() sorts them.
+    if method not in LINKAGES:
+        raise ValueError(f"unknown linkage {method!r}, expected one of {LINKAGES}")
+    n = len(rows)
+    d = condensed(as_matrix(rows), metric, p)
+    # row offsets: pair (i, j), i < j, lives at off[i] + j
+    off = [condensed_index(n, i, i + 1) - i - 1 for i in range(n)]
+    size = [1] * n
+    active = list(range(n))
+    merges = []
+    chain = []
+    for _ in range(n - 1):
+        if not chain:
+            chain.append(active[0])
+        while True:
+            x = chain[-1]
+            if len(chain) > 1:
+                y = chain[-2]
+                best = d[off[x] + y] if x < y else d[off[y] + x]
+            else:
+                y = None
+                best = float("inf")
+            ox = off[x]
+            for i in active:
+                if i < x:
+                    v = d[off[i] + x]
+                elif i > x:
+                    v = d[ox + i]
+                else:
+                    continue
+                if v < best:
+                    best, y = v, i
+            if len(chain) > 1 and y == chain[-2]:
+                break
+            chain.append(y)
+        chain.pop()
+        chain.pop()
+        if x > y:
+            x, y = y, x
+        n_x, n_y = size[x], size[y]
+        merges.append((x, y, best))
+
+        # the merged cluster lives on in slot y
+        size[x] = 0
+        size[y] = n_x + n_y
+        active.remove(x)
+        for i in active:
+            if i == y:
+                continue
+            ix = off[i] + x if i < x else off[x] + i
+            iy = off[i] + y if i < y else off[y] + i
+            d[iy] = lance_williams(method, d[ix], d[iy], n_x, n_y)
+    return merges
+
+
+def mst_single_linkage(rows, metric="euclidean", p=2):
+    # Prim's algorithm over distances computed on the fly: the MST edges,
+    # sorted by weight, are exactly the single-linkage merges, and only O(n)
+    # state (best edge into the tree per point) is ever held
+    n = len(rows)
+    if n < 2:
+        return []
+    X = as_matrix(rows)
+    best = array("d", [float("inf")]) * n
+    via = [0] * n
+    outside = list(range(1, n))
+    merges = []
+    last = 0
+    while outside:
+        pos, nearest_d = 0, float("inf")
+        ds = point_to_set(X[last], X, metric, p, indices=outside)
+        for k, (i, v) in enumerate(zip(outside, ds)):
+            if v < best[i]:
+                best[i] = v
+                via[i] = last
+            if best[i] < nearest_d:
+                pos, nearest_d = k, best[i]
+        nearest = outside[pos]
+        outside[pos] = outside[-1]
+        outside.pop()
+        merges.append((via[nearest], nearest, nearest_d))
+        last = nearest
+    return merges
+
+
+def label_merges(merges, n):
+    # scipy-style linkage table: row t merges clusters a and b at the given
+    # distance into cluster n + t of the given size (ids < n are points)
+    merges = sorted(merges, key=lambda m: m[2])
+    parent = list(range(n))
+    cluster_id = list(range(n))
+    size = [1] * n
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    table = []
+    for t, (x, y, dval) in enumerate(merges):
+        rx, ry = find(x), find(y)
+        a, b = sorted((cluster_id[rx], cluster_id[ry]))
+        size[ry] += size[rx]
+        table.append((a, b, dval, size[ry]))
+        parent[rx] = ry
+        cluster_id[ry] = n + t
+    return table
+
+
+def linkage(rows, method="single", mst=False, metric="euclidean", p=2):
+    if mst:
+        if method != "single":
+            raise ValueError("the MST path only computes single linkage")
+        return label_merges(mst_single_linkage(rows, metric, p), len(rows))
+    return label_merges(nn_chain(rows, method, metric, p), len(rows))
+
+
+def write_linkage(table, csv_path):
+    # full float precision so a later cut by distance sees the same values
+    with open(csv_path, "w", newline="") as f:
+        f.write("cluster_a,cluster_b,distance,size\n")
+        for a, b, dval, size in table:
+            f.write(f"{a},{b},{dval!r},{size}\n")
+
+
+def load_linkage(csv_path):
+    with open(csv_path, newline="") as f:
+        next(f)
+        table = []
+        for line in f:
+            if line.strip():
+                a, b, dval, size = line.strip().split(",")
+                table.append((int(a), int(b), float(dval), int(size)))
+    return table
+
+
+def cut_tree(table, k=None, threshold=None):
+    # flat clusters from a linkage table without re-running the clustering:
+    # merges are applied in order until k clusters remain, or while the merge
+    # distance is at most threshold; labels are numbered by first point
+    n = len(table) + 1
+    if (k is None) == (threshold is None):
+        raise ValueError("give exactly one of k or threshold")
+    parent = list(range(2 * n - 1))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    remaining = n
+    for t, (a, b, dval, size) in enumerate(table):
+        if k is not None and remaining <= k:
+            break
+        if threshold is not None and dval > threshold:
+            break
+        parent[find(a)] = n + t
+        parent[find(b)] = n + t
+        remaining -= 1
+
+    labels = []
+    ids = {}
+    for i in range(n):
+        labels.append(ids.setdefault(find(i), len(ids)))
+    return labels
+
+
+def replay(table, n):
+    # yields (clusters, distance) after every merge, keeping the cluster list
+    # order the scripts have always printed: survivors first, merged group last
+    members = {i: [i] for i in range(n)}
+    clusters = [i for i in range(n)]
+    for t, (a, b, dval, size) in enumerate(table):
+        pa, pb = sorted((clusters.index(a), clusters.index(b)))
+        first, second = clusters[pa], clusters[pb]
+        members[n + t] = members.pop(first) + members.pop(second)
+        clusters = [c for c in clusters if c != first and c != second] + [n + t]
+        yield [members[c] for c in clusters], dval
+
+
+def linkage_distance(rows, c1, c2, method, metric="euclidean", p=2):
+    ds = [v for row in pairwise([rows[i] for i in c1], [rows[j] for j in c2], metric, p, exact=True)
+          for v in row]
+    if method == "single":
+        return min(ds)
+    if method == "complete":
+        return max(ds)
+    return sum(ds) / len(ds) if ds else 0.0
+
+
+def write_step_matrix(step_name, clusters_data, rows, method, csv_path, metric="euclidean", p=2):
+    labels = ["|".join(f"p{i+1}" for i in sorted(cluster)) for cluster in clusters_data]
+    n = len(clusters_data)
+    matrix = []
+    for i in range(n):
+        row_vals = []
+        for j in range(n):
+            if i == j:
+                row_vals.append(0.0)
+            elif i > j:
+                row_vals.append(float(linkage_distance(rows, clusters_data[i], clusters_data[j],
+                                                       method, metric, p)))
+            else:
+                row_vals.append("")
+        matrix.append(row_vals)
+    with open(csv_path, "a", newline="") as f:
+        f.write(f"Grouping:,{step_name}\n")
+        f.write("," + ",".join(labels) + "\n")
+        for i in range(n):
+            values = [(f"{v:.4f}" if isinstance(v, float) else str(v)) for v in matrix[i]]
+            f.write(labels[i] + "," + ",".join(values) + "\n")
+        f.write("\n")
+
+
+def parse_args(method, argv=None):
+    parser = argparse.ArgumentParser(description=f"Agglomerative clustering, {method} linkage.")
+    if method == "single":
+        parser.add_argument("--mst", action="store_true",
+                            help="build the dendrogram with Prim's MST in O(n) memory")
+    parser.add_argument("--metric", choices=METRICS, default="euclidean",
+                        help="point-to-point distance (default: euclidean)")
+    parser.add_argument("-p", type=float, default=2,
+                        help="order of the minkowski metric (default: 2)")
+    parser.add_argument("--trace", action="store_true",
+                        help="debug: also print every grouping and write the full step matrices")
+    parser.add_argument("--from-linkage", action="store_true",
+                        help="skip clustering and cut the stored linkage table")
+    cut = parser.add_mutually_exclusive_group()
+    cut.add_argument("-k", type=int, default=None,
+                     help="cut the dendrogram into k clusters (default: 1)")
+    cut.add_argument("--threshold", type=float, default=None,
+                     help="cut the dendrogram at this merge distance")
+    return parser.parse_args(argv)
+
+
+def print_groups(clusters, labels_print, prefix="group", start=1):
+    for gi, g in enumerate(clusters):
+        print(f"{prefix}{gi+start}: " + "|".join(labels_print[idx] for idx in g))
+
+
+def main(method, path, out_path, matrix_path, linkage_path, argv=None):
+    args = parse_args(method, argv)
+    df = pd.read_csv(path)
+    num_cols = list(df.select_dtypes(include="number").columns)
+    if not num_cols:
+        raise SystemExit("No numeric columns found in the CSV.")
+
+    df_num = df[num_cols].dropna()
+    rows = df_num.values.tolist()
+    indexes = df_num.index.tolist()
+    labels_print = [f"p{i+1}" for i in range(len(rows))]
+
+    if args.from_linkage:
+        table = load_linkage(linkage_path)
+        if len(table) + 1 != len(rows):
+            raise SystemExit(f"{linkage_path} has {len(table)} merges but {path} has "
+                             f"{len(rows)} numeric rows; re-run without --from-linkage.")
+    else:
+        table = linkage(rows, method, getattr(args, "mst", False), args.metric, args.p)
+        write_linkage(table, linkage_path)
+        print(f"Linkage table ({len(table)} merges) written to {linkage_path}")
+
+    if args.trace:
+        clusters = [[i] for i in range(len(rows))]
+        open(matrix_path, "w").close()
+        write_step_matrix("initial", clusters, rows, method, matrix_path, args.metric, args.p)
+        print("Grouping: initial")
+        print_groups(clusters, labels_print)
+        print()
+        for step_idx, (clusters, best_d) in enumerate(replay(table, len(rows)), 1):
+            write_step_matrix(f"grouping_{step_idx}", clusters, rows, method, matrix_path,
+                              args.metric, args.p)
+            print(f"Grouping: grouping_{step_idx} (distance merged: {best_d:.4f})")
+            print_groups(clusters, labels_print)
+            print()
+
+    if not rows:
+        labels = []
+    elif args.threshold is not None:
+        labels = cut_tree(table, threshold=args.threshold)
+    else:
+        labels = cut_tree(table, k=args.k or 1)
+    clusters = [[] for _ in range(max(labels, default=-1) + 1)]
+    for idx, lbl in enumerate(labels):
+        clusters[lbl].append(idx)
+
+    df_out = df.copy()
+    df_out["cluster"] = pd.NA
+    for idx, lbl in zip(indexes, labels):
+        df_out.at[idx, "cluster"] = int(lbl)
+    df_out.to_csv(out_path, index=False)
+
+    print("Final clusters:")
+    print_groups(clusters, labels_print, prefix="cluster", start=0)
@@ -1,91 +1,135 @@
-import random
+import argparse
 import csv
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from distance import (as_matrix, dist as euclid, nearest as nearest_all, nearest_two, paired,
+                      pairwise, point_to_set, take)
 
 path = "data.csv"
 out_path = "k-means.csv"
-random.seed(42)
-
-# Read CSV and detect numeric columns
-with open(path, newline='', encoding='utf-8') as f:
-    reader = csv.reader(f)
-    header = next(reader)
-    all_rows = [row for row in reader]
-
-# determine numeric column indexes: consider a column numeric if all non-empty values parse as float
-num_cols_idx = []
-for ci, col in enumerate(header):
-    is_num = True
-    for r in all_rows:
-        try:
-            val = r[ci]
-        except Exception:
-            val = ''
-        if str(val).strip() == '':
-            continue
-        try:
-            float(val)
-        except Exception:
-            is_num = False
+steps_csv_path = "k-means-out.csv"
+max_iters = 1000
+seed = 42
+random.seed(seed)
+
+
+def numeric_columns(header, rows_iter):
+    # consider a column numeric if all non-empty values parse as float;
+    # rows are consumed one at a time so this works on a streamed reader
+    candidates = set(range(len(header)))
+    for r in rows_iter:
+        for ci in list(candidates):
+            val = r[ci] if ci < len(r) else ''
+            if str(val).strip() == '':
+                continue
+            try:
+                float(val)
+            except Exception:
+                candidates.discard(ci)
+        if not candidates:
             break
-    if is_num:
-        num_cols_idx.append(ci)
+    num_cols_idx = sorted(candidates)
+    if not num_cols_idx:
+        raise SystemExit("No numeric columns found in the CSV.")
+    return num_cols_idx
 
-num_cols = [header[i] for i in num_cols_idx]
-if not num_cols:
-    raise SystemExit("No numeric columns found in the CSV.")
 
-# build numeric rows and keep original indexes (row positions in the CSV data)
-rows = []
-indexes = []
-for idx, r in enumerate(all_rows):
+def numeric_values(r, num_cols_idx):
     try:
-        vals = [float(r[i]) for i in num_cols_idx]
+        return [float(r[i]) for i in num_cols_idx]
     except Exception:
-        continue
-    rows.append(vals)
-    indexes.append(idx)
+        return None
+
+
+def read_numeric_rows(csv_path):
+    # Read CSV and detect numeric columns
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        all_rows = [row for row in reader]
+
+    num_cols_idx = numeric_columns(header, all_rows)
+
+    # build numeric rows and keep original indexes (row positions in the CSV data)
+    rows = []
+    indexes = []
+    for idx, r in enumerate(all_rows):
+        vals = numeric_values(r, num_cols_idx)
+        if vals is None:
+            continue
+        rows.append(vals)
+        indexes.append(idx)
+    return header, all_rows, rows, indexes
 
-try:
-    k = int(input("Enter number of clusters k: ").strip())
-except Exception:
-    k = 3
-if k < 1:
-    k = 1
-if k > len(rows):
-    k = len(rows)
 
+def stream_numeric_chunks(csv_path, num_cols_idx, chunk_size):
+    # yields lists of numeric rows, never holding more than chunk_size of them
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        chunk = []
+        for r in reader:
+            vals = numeric_values(r, num_cols_idx)
+            if vals is None:
+                continue
+            chunk.append(vals)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
-def euclid(a, b):
-    return sum((x - y) ** 2 for x, y in zip(a, b)) ** 0.5
 
-def write_step_matrix(step_name, rows_data, centers, csv_path):
+TRACE_LEVELS = ("off", "centroids", "full")
+
+
+def point_matrix_lines(rows_data):
+    # the point-to-point matrix never changes, so it is formatted once
     labels = [f"p{i+1}" for i in range(len(rows_data))]
-    matrix = []
-    for i in range(len(rows_data)):
-        row_vals = []
-        for j in range(len(rows_data)):
-            if i == j:
-                row_vals.append(0.0)
-            elif i > j:
-                row_vals.append(euclid(rows_data[i], rows_data[j]))
-            else:
-                row_vals.append("")
-        matrix.append(row_vals)
+    lines = []
+    for i, d in enumerate(pairwise(rows_data, exact=True)):
+        values = [f"{d[j]:.4f}" for j in range(i)] + [f"{0.0:.4f}"]
+        values += [""] * (len(rows_data) - i - 1)
+        lines.append(labels[i] + "," + ",".join(values) + "\n")
+    return lines
+
+
+def write_step_matrix(f, step_name, rows_data, centers, matrix_lines=None):
+    labels = [f"p{i+1}" for i in range(len(rows_data))]
+    f.write(f"Step:,{step_name}\n")
+    f.write("," + ",".join(labels) + "\n")
+    if matrix_lines:
+        f.writelines(matrix_lines)
 
-    with open(csv_path, "a", newline="") as f:
-        f.write(f"Step:,{step_name}\n")
-        f.write("," + ",".join(labels) + "\n")
-        for i in range(len(rows_data)):
-            values = [
-                (f"{v:.4f}" if isinstance(v, float) else str(v)) for v in matrix[i]
-            ]
-            f.write(labels[i] + "," + ",".join(values) + "\n")
+    for ci, c in enumerate(centers):
+        dists = [f"{d:.4f}" for d in point_to_set(c, rows_data)]
+        f.write(f"c{ci+1}," + ",".join(dists) + "\n")
+    f.write("\n")
 
-        for ci, c in enumerate(centers):
-            dists = [f"{euclid(c, rows_data[j]):.4f}" for j in range(
-                len(rows_data))]
-            f.write(f"c{ci+1}," + ",".join(dists) + "\n")
-        f.write("\n")
+
+def step_tracer(f, rows_data, level, max_steps=None):
+    # returns an on_step callback writing to the open handle f, or None when off
+    if level == "off":
+        return None
+    rows_data = as_matrix(rows_data)
+    matrix_lines = point_matrix_lines(rows_data) if level == "full" else None
+    written = [0]
+
+    def on_step(step_name, centers):
+        if max_steps is not None and written[0] >= max_steps:
+            return
+        write_step_matrix(f, step_name, rows_data, centers, matrix_lines)
+        written[0] += 1
+    return on_step
 
 
 def mean_point(points):
@@ -94,32 +138,10 @@ def mean_point(points):
     return [sum(p[i] for p in points) / n for i in range(dim)]
 
 
-centroids = [list(rows[i]) for i in random.sample(range(len(rows)), k)]
-print("Initial centers:")
-for idx, c in enumerate(centroids):
-    print(f" Center {idx}: " + ", ".join(f"{x:.4f}" for x in c))
-
-steps_csv_path = "k-means-out.csv"
-open(steps_csv_path, "w").close()
-write_step_matrix("init", rows, centroids, steps_csv_path)
-
-max_iters = 1000
-for step in range(max_iters):
-    clusters = [[] for _ in range(k)]
-    labels = []
-    all_dists = []
-    for row_idx, x in enumerate(rows):
-        dists = [euclid(x, c) for c in centroids]
-        idx = dists.index(min(dists))
-        labels.append(idx)
-        clusters[idx].append(x)
-        all_dists.append(dists)
-
-    write_step_matrix(f"iter_{step}", rows, centroids, steps_csv_path)
-
+def update_centroids(rows, clusters, centroids):
     new_centroids = []
     changed = False
-    for i in range(k):
+    for i in range(len(centroids)):
         if clusters[i]:
             new_c = mean_point(clusters[i])
         else:
@@ -130,30 +152,389 @@ for step in range(max_iters):
                 if abs(a - b) > 1e-8:
                     changed = True
                     break
+    return new_centroids, changed
+
+
+def lloyd(rows, centroids, max_iters, on_step=None):
+    k = len(centroids)
+    stats = {"iterations": 0, "distances": 0, "skipped": 0}
+    X = as_matrix(rows)
+    for step in range(max_iters):
+        clusters = [[] for _ in range(k)]
+        labels, _ = nearest_all(X, as_matrix(centroids), exact=True)
+        for x, idx in zip(rows, labels):
+            clusters[idx].append(x)
+        stats["distances"] += len(rows) * k
+
+        if on_step:
+            on_step(f"iter_{step}", centroids)
+
+        centroids, changed = update_centroids(rows, clusters, centroids)
+        stats["iterations"] += 1
+        if not changed:
+            break
+    return labels, centroids, stats
+
+
+def hamerly(rows, centroids, max_iters, on_step=None):
+    # Hamerly's bounded assignment: upper[i] bounds the distance to the
+    # assigned centre, lower[i] the distance to every other centre. A point
+    # whose upper bound is below max(lower[i], half the gap from its centre
+    # to the nearest other centre) cannot change cluster, so its k distances
+    # are skipped. Bounds are strict so ties still resolve as in lloyd().
+    # The points that fail a bound are gathered and handled in one batch, and
+    # with numpy the bounds themselves are kept and tested as arrays.
+    k = len(centroids)
+    n = len(rows)
+    stats = {"iterations": 0, "distances": 0, "skipped": 0}
+    X = as_matrix(rows)
+    if np is not None:
+        labels = np.zeros(n, dtype=np.intp)
+        upper = np.zeros(n)
+        lower = np.zeros(n)
+    else:
+        labels = [0] * n
+        upper = [0.0] * n
+        lower = [0.0] * n
+
+    def assign_all(idx):
+        sub_labels, near, second = nearest_two(take(X, idx), as_matrix(centroids), exact=True)
+        if np is not None:
+            labels[idx] = sub_labels
+            upper[idx] = near
+            lower[idx] = second
+        else:
+            for i, lbl, u, lo in zip(idx, sub_labels, near, second):
+                labels[i] = lbl
+                upper[i] = u
+                lower[i] = lo
+        stats["distances"] += k * len(idx)
+
+    assign_all(list(range(n)))
+
+    for step in range(max_iters):
+        if step > 0:
+            if k > 1:
+                gaps = pairwise(centroids, centroids, exact=True)
+                half_gap = [min(gaps[a][b] for b in range(k) if b != a) / 2
+                            for a in range(k)]
+                stats["distances"] += k * (k - 1)
+            else:
+                half_gap = [float("inf")]
+            if np is not None:
+                bound = np.maximum(np.asarray(half_gap)[labels], lower)
+                stale = np.nonzero(upper >= bound)[0]
+                own = labels[stale]
+            else:
+                bound = [max(half_gap[labels[i]], lower[i]) for i in range(n)]
+                stale = [i for i in range(n) if upper[i] >= bound[i]]
+                own = [labels[i] for i in stale]
+            stats["skipped"] += k * (n - len(stale))
+            if len(stale):
+                near = paired(take(X, stale), take(as_matrix(centroids), own))
+                stats["distances"] += len(stale)
+                if np is not None:
+                    upper[stale] = near
+                    unsure = stale[upper[stale] >= bound[stale]]
+                else:
+                    unsure = []
+                    for i, u in zip(stale, near):
+                        upper[i] = u
+                        if u >= bound[i]:
+                            unsure.append(i)
+                stats["skipped"] += (k - 1) * (len(stale) - len(unsure))
+                if len(unsure):
+                    assign_all(unsure)
+                    stats["distances"] -= len(unsure)
+
+        clusters = [[] for _ in range(k)]
+        for x, lbl in zip(rows, labels.tolist() if np is not None else labels):
+            clusters[lbl].append(x)
+
+        if on_step:
+            on_step(f"iter_{step}", centroids)
+
+        new_centroids, changed = update_centroids(rows, clusters, centroids)
+        stats["iterations"] += 1
+        if not changed:
+            centroids = new_centroids
+            break
+
+        # centres moved: loosen every bound by how far the relevant centre went
+        moved = [euclid(a, b) for a, b in zip(centroids, new_centroids)]
+        max_moved = max(moved)
+        if np is not None:
+            upper += np.asarray(moved)[labels]
+            lower -= max_moved
+        else:
+            for i in range(n):
+                upper[i] += moved[labels[i]]
+                lower[i] -= max_moved
+        centroids = new_centroids
+    return (labels.tolist() if np is not None else labels), centroids, stats
+
+
+ASSIGNMENT_METHODS = {"lloyd": lloyd, "hamerly": hamerly}
+
+
+def nearest(x, centroids):
+    dists = [euclid(x, c) for c in centroids]
+    return dists.index(min(dists))
+
+
+def init_random(rows, k):
+    return [list(rows[i]) for i in random.sample(range(len(rows)), k)]
+
+
+def weighted_pick(weights):
+    total = sum(weights)
+    if total <= 0:
+        return random.randrange(len(weights))
+    r = random.random() * total
+    acc = 0.0
+    for i, w in enumerate(weights):
+        acc += w
+        if acc > r:
+            return i
+    return len(weights) - 1
+
+
+def init_kmeans_pp(rows, k, weights=None):
+    # k-means++: each new centre is drawn with probability proportional to
+    # (weight times) its squared distance from the nearest centre so far
+    if weights is None:
+        weights = [1.0] * len(rows)
+    X = as_matrix(rows)
+    centroids = [list(rows[weighted_pick(weights)])]
+    d2 = [v * v for v in point_to_set(centroids[0], X)]
+    while len(centroids) < k:
+        c = list(rows[weighted_pick([w * d for w, d in zip(weights, d2)])])
+        centroids.append(c)
+        d2 = [min(d, v * v) for d, v in zip(d2, point_to_set(c, X))]
+    return centroids
+
+
+def init_kmeans_parallel(rows, k, rounds=5, oversample=None):
+    # k-means||: a few rounds each keep every point independently with
+    # probability oversample * d2 / cost, then the candidates, weighted by how
+    # many points they are nearest to, are reduced to k centres by k-means++
+    n = len(rows)
+    oversample = oversample or 2 * k
+    X = as_matrix(rows)
+    chosen = [random.randrange(n)]
+    d2 = [v * v for v in point_to_set(rows[chosen[0]], X)]
+    for _ in range(rounds):
+        cost = sum(d2)
+        if cost <= 0:
+            break
+        picked = [i for i in range(n) if random.random() < oversample * d2[i] / cost]
+        for i in picked:
+            d2 = [min(d, v * v) for d, v in zip(d2, point_to_set(rows[i], X))]
+        chosen += picked
+    if len(chosen) < k:
+        taken = set(chosen)
+        rest = [i for i in range(n) if i not in taken]
+        chosen += random.sample(rest, k - len(chosen))
+
+    candidates = [rows[i] for i in chosen]
+    weights = [0] * len(candidates)
+    for ci in nearest_all(X, as_matrix(candidates))[0]:
+        weights[ci] += 1
+    return init_kmeans_pp(candidates, k, weights)
+
+
+INIT_METHODS = {"random": init_random, "kmeans++": init_kmeans_pp, "kmeans||": init_kmeans_parallel}
+
+
+def inertia(rows, centroids):
+    dists = nearest_all(as_matrix(rows), as_matrix(centroids))[1]
+    return sum(d * d for d in dists)
+
+
+def run_seed(rows, k, restart_seed, init="kmeans++", method="hamerly"):
+    random.seed(restart_seed)
+    centroids = INIT_METHODS[init](rows, k)
+    labels, centroids, stats = ASSIGNMENT_METHODS[method](rows, centroids, max_iters)
+    return inertia(rows, centroids), restart_seed, labels, centroids, stats
+
+
+def multi_restart(rows, k, restarts, init="kmeans++", method="hamerly", workers=None):
+    # independent seeds in a process pool; the lowest inertia wins, ties go
+    # to the smaller seed so the result does not depend on scheduling
+    workers = workers or os.cpu_count() or 1
+    seeds = [seed + i for i in range(restarts)]
+    with ProcessPoolExecutor(max_workers=min(workers, restarts)) as pool:
+        results = list(pool.map(run_seed, [rows] * restarts, [k] * restarts, seeds,
+                                [init] * restarts, [method] * restarts))
+    return min(results, key=lambda r: (r[0], r[1]))
+
+
+def minibatch_kmeans(csv_path, num_cols_idx, k, chunk_size=1000, epochs=10, tol=1e-8):
+    # Sculley's mini-batch k-means over a streamed CSV: each chunk is assigned
+    # to the current centres, then every point pulls its centre towards it
+    # with a per-centre learning rate of 1 / (points seen by that centre).
+    centroids = []
+    for chunk in stream_numeric_chunks(csv_path, num_cols_idx, chunk_size):
+        need = min(k - len(centroids), len(chunk))
+        centroids += [list(chunk[i]) for i in random.sample(range(len(chunk)), need)]
+        if len(centroids) >= k:
+            break
+    if not centroids:
+        raise SystemExit("No numeric rows found in the CSV.")
+
+    counts = [0] * len(centroids)
+    stats = {"epochs": 0, "batches": 0}
+    for epoch in range(epochs):
+        before = [list(c) for c in centroids]
+        for chunk in stream_numeric_chunks(csv_path, num_cols_idx, chunk_size):
+            assigned = nearest_all(as_matrix(chunk), as_matrix(centroids), exact=True)[0]
+            for x, ci in zip(chunk, assigned):
+                counts[ci] += 1
+                eta = 1.0 / counts[ci]
+                c = centroids[ci]
+                for d in range(len(c)):
+                    c[d] += eta * (x[d] - c[d])
+            stats["batches"] += 1
+        stats["epochs"] += 1
+        if max(euclid(a, b) for a, b in zip(before, centroids)) <= tol:
+            break
+    return centroids, stats
+
+
+def write_streamed_labels(csv_path, out_csv_path, num_cols_idx, centroids):
+    # final labelling pass: one input row in, one output row out
+    counts = [0] * len(centroids)
+    with open(csv_path, newline='', encoding='utf-8') as src, \
+            open(out_csv_path, 'w', newline='', encoding='utf-8') as f:
+        reader = csv.reader(src)
+        writer = csv.writer(f)
+        header = next(reader)
+        writer.writerow(header + ['cluster'])
+        for row in reader:
+            out_row = list(row)
+            # pad row to header length if necessary
+            if len(out_row) < len(header):
+                out_row += [''] * (len(header) - len(out_row))
+            cluster_val = ''
+            vals = numeric_values(row, num_cols_idx)
+            if vals is not None:
+                cluster_val = nearest(vals, centroids)
+                counts[cluster_val] += 1
+            out_row.append(cluster_val)
+            writer.writerow(out_row)
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="K-means clustering of a numeric CSV.")
+    parser.add_argument("-k", type=int, default=None,
+                        help="number of clusters (prompted when omitted)")
+    parser.add_argument("--method", choices=sorted(ASSIGNMENT_METHODS), default="hamerly",
+                        help="assignment step (default: hamerly)")
+    parser.add_argument("--trace", choices=TRACE_LEVELS, default="off",
+                        help="debug: what to write to k-means-out.csv each step: nothing, "
+                             "centre-to-point distances, or those plus the point matrix (default: off)")
+    parser.add_argument("--trace-steps", type=int, default=None,
+                        help="stop tracing after this many steps (default: all)")
+    parser.add_argument("--minibatch", action="store_true",
+                        help="stream the CSV in chunks and run mini-batch k-means "
+                             "(bounded memory, no step trace)")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="rows per mini-batch (default: 1000)")
+    parser.add_argument("--epochs", type=int, default=10,
+                        help="maximum passes over the CSV in mini-batch mode (default: 10)")
+    parser.add_argument("--init", choices=list(INIT_METHODS), default="random",
+                        help="centre seeding (default: random)")
+    parser.add_argument("--restarts", type=int, default=1,
+                        help="run this many seeds in parallel and keep the lowest-inertia "
+                             "result (no step trace)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for --restarts (default: CPU count)")
+    return parser.parse_args(argv)
+
+
+def read_k(k=None):
+    if k is None:
+        try:
+            k = int(input("Enter number of clusters k: ").strip())
+        except Exception:
+            k = 3
+    return max(k, 1)
+
+
+def print_result(counts, centroids):
+    print("\nFinal cluster sizes:", counts)
+    print("Final centroids:")
+    for i, c in enumerate(centroids):
+        print(f" C{i}: " + ", ".join(f"{x:.4f}" for x in c))
+
+
+def run_minibatch(args):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        num_cols_idx = numeric_columns(header, reader)
+
+    k = read_k(args.k)
+    centroids, stats = minibatch_kmeans(path, num_cols_idx, k, args.chunk_size, args.epochs)
+    counts = write_streamed_labels(path, out_path, num_cols_idx, centroids)
+    print_result(counts, centroids)
+    print(f"Epochs: {stats['epochs']}, batches: {stats['batches']}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.minibatch:
+        run_minibatch(args)
+        return
+    header, all_rows, rows, indexes = read_numeric_rows(path)
+
+    k = read_k(args.k)
+    if k > len(rows):
+        k = len(rows)
+
+    if args.restarts > 1:
+        score, best_seed, labels, centroids, stats = multi_restart(
+            rows, k, args.restarts, args.init, args.method, args.workers)
+        print(f"Best of {args.restarts} restarts: seed {best_seed}, inertia {score:.4f}")
+    else:
+        centroids = INIT_METHODS[args.init](rows, k)
+        print("Initial centers:")
+        for idx, c in enumerate(centroids):
+            print(f" Center {idx}: " + ", ".join(f"{x:.4f}" for x in c))
+
+        if args.trace == "off":
+            labels, centroids, stats = ASSIGNMENT_METHODS[args.method](
+                rows, centroids, max_iters)
+        else:
+            with open(steps_csv_path, "w", newline="") as f:
+                on_step = step_tracer(f, rows, args.trace, args.trace_steps)
+                on_step("init", centroids)
+                labels, centroids, stats = ASSIGNMENT_METHODS[args.method](
+                    rows, centroids, max_iters, on_step)
+
+    counts = [labels.count(i) for i in range(k)]
+
+    # write output CSV: original rows with appended cluster column
+    cluster_map = {orig_idx: lbl for orig_idx, lbl in zip(indexes, labels)}
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header + ['cluster'])
+        for i, row in enumerate(all_rows):
+            out_row = list(row)
+            # pad row to header length if necessary
+            if len(out_row) < len(header):
+                out_row += [''] * (len(header) - len(out_row))
+            cluster_val = ''
+            if i in cluster_map:
+                cluster_val = int(cluster_map[i])
+            out_row.append(cluster_val)
+            writer.writerow(out_row)
+
+    print_result(counts, centroids)
+    print(f"Iterations: {stats['iterations']}, distance computations: "
+          f"{stats['distances']}, skipped: {stats['skipped']}")
+
 
-    centroids = new_centroids
-    if not changed:
-        break
-
-counts = [labels.count(i) for i in range(k)]
-
-# write output CSV: original rows with appended cluster column
-cluster_map = {orig_idx: lbl for orig_idx, lbl in zip(indexes, labels)}
-with open(out_path, 'w', newline='', encoding='utf-8') as f:
-    writer = csv.writer(f)
-    writer.writerow(header + ['cluster'])
-    for i, row in enumerate(all_rows):
-        out_row = list(row)
-        # pad row to header length if necessary
-        if len(out_row) < len(header):
-            out_row += [''] * (len(header) - len(out_row))
-        cluster_val = ''
-        if i in cluster_map:
-            cluster_val = int(cluster_map[i])
-        out_row.append(cluster_val)
-        writer.writerow(out_row)
-
-print("\nFinal cluster sizes:", counts)
-print("Final centroids:")
-for i, c in enumerate(centroids):
-    print(f" C{i}: " + ", ".join(f"{x:.4f}" for x in c))
+if __name__ == "__main__":
+    main()
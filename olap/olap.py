@@ -1,16 +1,71 @@
+import argparse
 import csv
+import heapq
 import itertools
+import json
+import os
 import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-def read_data(filename='data.csv'):
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# dense cuboids allocate one cell per combination of dimension values; past
+# this many cells the dict engine is used instead
+MAX_DENSE_CELLS = 50_000_000
+# the dict engine does one update per row and cuboid (rows * 2^d); on sparse
+# data where the whole dense lattice holds more than this many cells per
+# such update, allocating and scanning empty cells costs more than it saves
+MAX_DENSE_CELLS_PER_UPDATE = 32
+
+# past this many dimensions main() materialises only a greedy selection of
+# cuboids instead of all 2^d of them
+FULL_CUBE_MAX_DIMS = 12
+PARTIAL_QUERY_DIMS = 3
+
+# sum, count, min and max merge across partitions; avg is derived from them
+DISTRIBUTIVE = ('sum', 'count', 'min', 'max')
+AGGREGATES = DISTRIBUTIVE + ('avg',)
+
+
+def aggregate_column(measure, agg):
+    # the sum keeps the measure's own name, as in cube_output.csv
+    return measure if agg == 'sum' else f"{measure}_{agg}"
+
+
+def stat_value(stats, agg):
+    # stats is a [sum, count, min, max] cell
+    if agg == 'avg':
+        return stats[0] / stats[1] if stats[1] else 0.0
+    return stats[DISTRIBUTIVE.index(agg)]
+
+
+def merge_stats(into, stats):
+    into[0] += stats[0]
+    into[1] += stats[1]
+    if stats[2] < into[2]:
+        into[2] = stats[2]
+    if stats[3] > into[3]:
+        into[3] = stats[3]
+
+
+def new_stats():
+    return [0.0, 0, float('inf'), float('-inf')]
+
+
+def read_data(filename='data.csv', measure=None):
     with open(filename, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         rows = [row for row in reader]
         fieldnames = reader.fieldnames or []
 
-    print(f"Columns in data: {fieldnames}")
-    measure = input("Enter target (measure) column name: ").strip()
+    if measure is None:
+        print(f"Columns in data: {fieldnames}")
+        measure = input("Enter target (measure) column name: ").strip()
     if measure not in fieldnames:
         raise RuntimeError(f"Column '{measure}' not found in data.")
     dims = [c for c in fieldnames if c != measure]
@@ -33,91 +88,726 @@ def all_subsets(seq):
         for comb in itertools.combinations(items, r):
             yield comb
 
-def build_olap_cube(rows, dims, measure, fill_value='ALL'):
+def encode_dimensions(rows, dims):
+    # one pass per dimension: sorted distinct values plus an integer code
+    # per row, so aggregation never touches the strings again
+    levels = []
+    codes = []
+    for d in dims:
+        values, inverse = np.unique(np.array([r[d] for r in rows], dtype=object),
+                                    return_inverse=True)
+        levels.append(values.tolist())
+        codes.append(inverse.reshape(-1).astype(np.intp))
+    return levels, codes
+
+
+def build_dense_cuboids(rows, dims, measure, aggregates=('sum',),
+                        base_only=False):
+    # aggregate the finest group-by once with bincount, then derive every
+    # coarser cuboid by reducing one axis out of its smallest computed parent
+    levels, codes = encode_dimensions(rows, dims)
+    shape = tuple(len(v) for v in levels)
+    values = np.array([r[measure] for r in rows], dtype=np.float64)
+    size = int(np.prod(shape)) if shape else 1
+
+    if len(rows):
+        flat = np.ravel_multi_index(codes, shape) if dims else np.zeros(len(rows), dtype=np.intp)
+    else:
+        flat = np.zeros(0, dtype=np.intp)
+    base = {'sum': np.bincount(flat, weights=values, minlength=size).reshape(shape),
+            'count': np.bincount(flat, minlength=size).reshape(shape)}
+    if 'min' in aggregates:
+        base['min'] = np.full(size, np.inf)
+        np.minimum.at(base['min'], flat, values)
+        base['min'] = base['min'].reshape(shape)
+    if 'max' in aggregates:
+        base['max'] = np.full(size, -np.inf)
+        np.maximum.at(base['max'], flat, values)
+        base['max'] = base['max'].reshape(shape)
+    if base_only:
+        return levels, base
+
+    full = tuple(range(len(dims)))
+    cuboids = {full: base}
+    for r in range(len(dims) - 1, -1, -1):
+        for subset in itertools.combinations(full, r):
+            parent = min((tuple(sorted(subset + (d,))) for d in full if d not in subset),
+                         key=lambda p: cuboids[p]['count'].size)
+            axis = next(i for i, d in enumerate(parent) if d not in subset)
+            cuboids[subset] = reduce_cuboid(cuboids[parent], axis)
+    return levels, cuboids
+
+
+def reduce_cuboid(parent, axis):
+    out = {}
+    for agg, arr in parent.items():
+        if agg == 'min':
+            out[agg] = arr.min(axis=axis, initial=np.inf)
+        elif agg == 'max':
+            out[agg] = arr.max(axis=axis, initial=-np.inf)
+        else:
+            out[agg] = arr.sum(axis=axis)
+    return out
+
+
+def shared_array(shape, dtype, shms):
+    # a numpy view over a fresh shared memory block
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+    shms.append(shm)
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return arr, (shm.name, shape, dtype.str)
+
+
+def attach(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def reduce_shared(parent_specs, axis, out_specs):
+    # worker side: read the parent cuboid and write the child straight into
+    # the shared blocks the coordinator allocated, so no array is pickled
+    opened = []
+    try:
+        parent = {}
+        for agg, spec in parent_specs.items():
+            shm, arr = attach(spec)
+            opened.append(shm)
+            parent[agg] = arr
+        for agg, arr in reduce_cuboid(parent, axis).items():
+            shm, out = attach(out_specs[agg])
+            opened.append(shm)
+            out[...] = arr
+    finally:
+        for shm in opened:
+            shm.close()
+
+
+def build_dense_cuboids_parallel(rows, dims, measure, aggregates=('sum',),
+                                 workers=None):
+    # the base cuboid comes from one bincount pass; the lattice is then
+    # computed level by level, every cuboid of a level in parallel from its
+    # smallest parent on the level above, all through shared memory
+    levels, base = build_dense_cuboids(rows, dims, measure, aggregates,
+                                       base_only=True)
+    full = tuple(range(len(dims)))
+    shms = []
+    try:
+        arrays = {full: {}}
+        specs = {full: {}}
+        for agg, arr in base.items():
+            arrays[full][agg], specs[full][agg] = shared_array(arr.shape, arr.dtype, shms)
+            arrays[full][agg][...] = arr
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for r in range(len(dims) - 1, -1, -1):
+                jobs = []
+                for subset in itertools.combinations(full, r):
+                    parent = min((tuple(sorted(subset + (d,))) for d in full if d not in subset),
+                                 key=lambda p: arrays[p]['count'].size)
+                    axis = next(i for i, d in enumerate(parent) if d not in subset)
+                    arrays[subset] = {}
+                    specs[subset] = {}
+                    for agg, parent_arr in arrays[parent].items():
+                        shape = parent_arr.shape[:axis] + parent_arr.shape[axis+1:]
+                        arrays[subset][agg], specs[subset][agg] = shared_array(
+                            shape, parent_arr.dtype, shms)
+                    jobs.append(pool.submit(reduce_shared, specs[parent], axis,
+                                            specs[subset]))
+                for job in jobs:
+                    job.result()
+
+        cuboids = {subset: {agg: np.array(view) for agg, view in views.items()}
+                   for subset, views in arrays.items()}
+    finally:
+        # views must go before their blocks can be closed
+        arrays = parent_arr = None
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return levels, cuboids
+
+
+def dense_cube_rows(levels, cuboids, dims, measure, fill_value='ALL',
+                    aggregates=('sum',)):
     cube_rows = []
+    for subset, arrays in cuboids.items():
+        # empty cells of the dense array never occurred in the data
+        cells = zip(*np.nonzero(arrays['count'] > 0)) if subset else [()]
+        for pos in cells:
+            out = {d: fill_value for d in dims}
+            for d, code in zip(subset, pos):
+                out[dims[d]] = levels[d][code]
+            count = int(arrays['count'][pos])
+            for agg in aggregates:
+                if agg == 'count':
+                    value = count
+                elif not count:
+                    # only the apex of an empty cube has no rows
+                    value = 0.0
+                elif agg == 'avg':
+                    value = float(arrays['sum'][pos]) / count
+                else:
+                    value = float(arrays[agg][pos])
+                out[aggregate_column(measure, agg)] = value
+            cube_rows.append(out)
+    return cube_rows
 
-    total = sum(r[measure] for r in rows)
-    row = {d: fill_value for d in dims}
-    row[measure] = float(total)
-    cube_rows.append(row)
 
-    
-    for subset in (s for s in all_subsets(dims) if len(s) > 0):
-        agg = defaultdict(float)
+def build_olap_cube(rows, dims, measure, fill_value='ALL', engine=None,
+                    aggregates=('sum',), workers=None):
+    bad = [a for a in aggregates if a not in AGGREGATES]
+    if bad:
+        raise ValueError(f"Unknown aggregates {bad}; choose from {AGGREGATES}")
+    if engine is None:
+        cells = lattice = 1
+        for d in dims:
+            card = len({r[d] for r in rows})
+            cells *= card
+            lattice *= card + 1
+        sparse = lattice > MAX_DENSE_CELLS_PER_UPDATE * max(len(rows), 1) * 2 ** len(dims)
+        engine = ('dense' if np is not None and cells <= MAX_DENSE_CELLS and not sparse
+                  else 'dict')
+    if engine == 'dense':
+        if np is None:
+            raise RuntimeError("The dense cube engine needs numpy installed.")
+        if workers and workers > 1:
+            levels, cuboids = build_dense_cuboids_parallel(
+                rows, dims, measure, aggregates, workers)
+        else:
+            levels, cuboids = build_dense_cuboids(rows, dims, measure, aggregates)
+        cube_rows = dense_cube_rows(levels, cuboids, dims, measure, fill_value,
+                                    aggregates)
+        cube_rows.sort(key=lambda r: tuple(r[d] for d in dims))
+        return cube_rows
+    if engine != 'dict':
+        raise ValueError("engine must be 'dense' or 'dict'")
+
+    cube_rows = []
+    for subset in all_subsets(dims):
+        agg = defaultdict(new_stats)
         for r in rows:
             key = tuple(r[d] for d in subset)
-            agg[key] += r[measure]
+            merge_stats(agg[key], (r[measure], 1, r[measure], r[measure]))
+        if not subset and not rows:
+            agg[()] = [0.0, 0, 0.0, 0.0]
 
-        for key, val in agg.items():
+        for key, stats in agg.items():
             out = {}
             for d in dims:
                 if d in subset:
                     out[d] = key[subset.index(d)]
                 else:
                     out[d] = fill_value
-            out[measure] = float(val)
+            for a in aggregates:
+                if a == 'count':
+                    out[aggregate_column(measure, a)] = stats[1]
+                else:
+                    out[aggregate_column(measure, a)] = float(stat_value(stats, a))
             cube_rows.append(out)
 
     cube_rows.sort(key=lambda r: tuple(r[d] for d in dims))
     return cube_rows
 
+class OlapCube:
+    # cube rows plus two indexes over row positions: the cuboid (set of
+    # non-ALL dimensions) each row belongs to, and, per dimension, the rows
+    # holding each value. Positions follow the sorted cube order, so merged
+    # position lists come back in the same order a full scan would give.
+    def __init__(self, cube_rows, dims, measure, fill_value='ALL'):
+        self.rows = cube_rows
+        self.dims = list(dims)
+        self.measure = measure
+        self.fill_value = fill_value
+        self.cuboids = defaultdict(list)
+        self.value_index = {d: defaultdict(list) for d in dims}
+        for pos, r in enumerate(cube_rows):
+            self.cuboids[frozenset(d for d in dims if r[d] != fill_value)].append(pos)
+            for d in dims:
+                self.value_index[d][r[d]].append(pos)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def cuboid_positions(self, match):
+        lists = [ids for key, ids in self.cuboids.items() if match(key)]
+        return list(heapq.merge(*lists))
+
+    def project(self, positions, columns):
+        res = []
+        seen = set()
+        for pos in positions:
+            r = self.rows[pos]
+            key = tuple(r[d] for d in columns) + (r[self.measure],)
+            if key in seen:
+                continue
+            seen.add(key)
+            out = {d: r[d] for d in columns}
+            out[self.measure] = r[self.measure]
+            res.append(out)
+        return res
+
+    def roll_up(self, target_dims):
+        target = set(target_dims)
+        return self.project(self.cuboid_positions(lambda key: key <= target),
+                            target_dims)
+
+    def drill_down(self, drill_dims):
+        drill = set(drill_dims)
+        return self.project(self.cuboid_positions(lambda key: key >= drill),
+                            drill_dims)
+
+    def positions_for(self, filters):
+        matched = None
+        for d, v in filters.items():
+            index = self.value_index[d]
+            if isinstance(v, (list, tuple, set)):
+                ids = set()
+                for x in v:
+                    ids.update(index.get(str(x), ()))
+            else:
+                ids = index.get(str(v), ())
+            matched = set(ids) if matched is None else matched.intersection(ids)
+            if not matched:
+                return []
+        if matched is None:
+            return range(len(self.rows))
+        return sorted(matched)
+
+    def select(self, positions):
+        cols = self.dims + [self.measure]
+        return [{d: self.rows[pos][d] for d in cols} for pos in positions]
+
+    def slice(self, slice_dim, value):
+        return self.select(self.value_index[slice_dim].get(str(value), ()))
+
+    def dice(self, filters):
+        return self.select(self.positions_for(filters))
+
+
+def as_cube(cube_rows, dims, measure):
+    if isinstance(cube_rows, (OlapCube, MappedCube)):
+        return cube_rows
+    return OlapCube(cube_rows, dims, measure)
+
 def roll_up(cube_rows, dims, measure, target_dims):
-    res = []
-    seen = set()
-    for r in cube_rows:
-        ok = True
-        for d in dims:
-            if d not in target_dims and r[d] != 'ALL':
-                ok = False
-                break
-        if not ok:
-            continue
-        key = tuple(r[d] for d in target_dims) + (r[measure],)
-        if key in seen:
-            continue
-        seen.add(key)
-        out = {d: r[d] for d in target_dims}
-        out[measure] = r[measure]
-        res.append(out)
-    return res
+    return as_cube(cube_rows, dims, measure).roll_up(target_dims)
 
 def drill_down(cube_rows, dims, measure, drill_dims):
-    res = []
-    seen = set()
-    for r in cube_rows:
-        ok = all(r[d] != 'ALL' for d in drill_dims)
-        if not ok:
-            continue
-        key = tuple(r[d] for d in drill_dims) + (r[measure],)
-        if key in seen:
-            continue
-        seen.add(key)
-        out = {d: r[d] for d in drill_dims}
-        out[measure] = r[measure]
-        res.append(out)
-    return res
+    return as_cube(cube_rows, dims, measure).drill_down(drill_dims)
 
 def slice_cube(cube_rows, dims, measure, slice_dim, value):
-    v = str(value)
-    res = [ {d: r[d] for d in dims + [measure]} for r in cube_rows if r[slice_dim] == v ]
-    return res
+    return as_cube(cube_rows, dims, measure).slice(slice_dim, value)
 
 def dice_cube(cube_rows, dims, measure, filters):
-    res = []
-    for r in cube_rows:
-        ok = True
-        for d, v in filters.items():
-            if isinstance(v, (list, tuple, set)):
-                if r[d] not in [str(x) for x in v]:
-                    ok = False
+    return as_cube(cube_rows, dims, measure).dice(filters)
+
+def estimate_cuboid_sizes(rows, dims, masks):
+    # analytical estimate: a group-by cannot have more cells than rows, nor
+    # more than the product of its dimensions' cardinalities
+    n = len(rows)
+    cards = [len({r[d] for r in rows}) for d in dims]
+    sizes = {}
+    for mask in masks:
+        size = 1
+        for i, card in enumerate(cards):
+            if mask >> i & 1:
+                size *= card
+                if size >= n:
                     break
-            else:
-                if r[d] != str(v):
-                    ok = False
+        sizes[mask] = max(1, min(size, n))
+    return sizes
+
+
+def select_views(sizes, n_dims, budget_rows, queries=None):
+    # Harinarayan-Rajaraman-Ullman greedy: the base cuboid is always kept;
+    # each round adds the view whose rows most reduce the total cost of the
+    # queries it can answer, while the added views fit in budget_rows
+    top = (1 << n_dims) - 1
+    if queries is None:
+        queries = [m for m in sizes if m != top]
+    cost = {w: sizes[top] for w in queries}
+    selected = [top]
+    candidates = set(queries) - {top}
+    used = 0
+    while candidates:
+        best, best_benefit = None, 0
+        for v in candidates:
+            size = sizes[v]
+            if used + size > budget_rows:
+                continue
+            benefit = 0
+            sub = v
+            while True:
+                c = cost.get(sub)
+                if c is not None and c > size:
+                    benefit += c - size
+                if sub == 0:
                     break
+                sub = (sub - 1) & v
+            if benefit > best_benefit:
+                best, best_benefit = v, benefit
+        if best is None:
+            break
+        selected.append(best)
+        used += sizes[best]
+        candidates.discard(best)
+        for w in cost:
+            if w & ~best == 0 and sizes[best] < cost[w]:
+                cost[w] = sizes[best]
+    return selected
+
+
+class PartialCube:
+    # only the selected cuboids are kept, as {key tuple: [sum, count, min,
+    # max]} dicts keyed by a bitmask over dims; any other group-by is
+    # re-aggregated from the smallest materialised cuboid that covers it.
+    # With every view selected this is simply the full cube.
+    def __init__(self, rows, dims, measure, views, fill_value='ALL'):
+        self.dims = list(dims)
+        self.measure = measure
+        self.fill_value = fill_value
+        self.cuboids = {}
+        top = (1 << len(dims)) - 1
+        self.cuboids[top] = self.base_cells(rows)
+        for mask in sorted(set(views) - {top}, key=lambda m: -bin(m).count('1')):
+            parent = self.ancestor(mask)
+            self.cuboids[mask] = self.aggregate(parent, mask)
+
+    @classmethod
+    def from_cube_rows(cls, cube_rows, dims, measure, fill_value='ALL'):
+        # each row's cuboid is the set of its non-ALL dimensions
+        cube = cls([], dims, measure, [], fill_value)
+        cube.cuboids = {}
+        cols = [aggregate_column(measure, a) for a in DISTRIBUTIVE]
+        for r in cube_rows:
+            mask = cube.mask_of(d for d in dims if r[d] != fill_value)
+            key = tuple(r[dims[i]] for i in cube.positions(mask))
+            stats = [float(r[cols[0]]), int(r[cols[1]]),
+                     float(r[cols[2]]), float(r[cols[3]])]
+            cube.cuboids.setdefault(mask, {})[key] = stats
+        return cube
+
+    def base_cells(self, rows):
+        cells = defaultdict(new_stats)
+        for r in rows:
+            v = r[self.measure]
+            merge_stats(cells[tuple(r[d] for d in self.dims)], (v, 1, v, v))
+        return dict(cells)
+
+    def mask_of(self, group_dims):
+        mask = 0
+        for d in group_dims:
+            mask |= 1 << self.dims.index(d)
+        return mask
+
+    def positions(self, mask):
+        return [i for i in range(len(self.dims)) if mask >> i & 1]
+
+    def ancestor(self, mask):
+        return min((m for m in self.cuboids if m & mask == mask),
+                   key=lambda m: len(self.cuboids[m]))
+
+    def aggregate(self, parent, mask, filters=None, cells=None):
+        cols = self.positions(parent)
+        keep = [cols.index(i) for i in self.positions(mask)]
+        checks = []
+        for d, v in (filters or {}).items():
+            allowed = {str(x) for x in v} if isinstance(v, (list, tuple, set)) else {str(v)}
+            checks.append((cols.index(self.dims.index(d)), allowed))
+        agg = defaultdict(new_stats)
+        source = self.cuboids[parent] if cells is None else cells
+        for key, stats in source.items():
+            if all(key[i] in allowed for i, allowed in checks):
+                merge_stats(agg[tuple(key[i] for i in keep)], stats)
+        return dict(agg)
+
+    def query(self, group_dims, filters=None, agg='sum'):
+        mask = self.mask_of(group_dims)
+        need = mask | self.mask_of(filters or {})
+        if mask in self.cuboids and not filters:
+            cells = self.cuboids[mask]
+        else:
+            cells = self.aggregate(self.ancestor(need), mask, filters)
+        names = [self.dims[i] for i in self.positions(mask)]
+        res = []
+        for key in sorted(cells):
+            out = dict(zip(names, key))
+            out[aggregate_column(self.measure, agg)] = stat_value(cells[key], agg)
+            res.append(out)
+        return res
+
+    def add_rows(self, rows):
+        # delta aggregation: the new rows are grouped once at the finest
+        # level, then each materialised cuboid merges its projection of that
+        # delta in place; sum, count, min and max all merge exactly
+        top = (1 << len(self.dims)) - 1
+        delta = self.base_cells(rows)
+        for mask, cells in self.cuboids.items():
+            projected = delta if mask == top else self.aggregate(top, mask, cells=delta)
+            for key, stats in projected.items():
+                if key in cells:
+                    merge_stats(cells[key], stats)
+                else:
+                    cells[key] = stats
+
+    def cube_rows(self, aggregates=('sum',)):
+        rows = []
+        for mask, cells in self.cuboids.items():
+            names = [self.dims[i] for i in self.positions(mask)]
+            for key, stats in cells.items():
+                out = {d: self.fill_value for d in self.dims}
+                out.update(zip(names, key))
+                for a in aggregates:
+                    value = stat_value(stats, a)
+                    out[aggregate_column(self.measure, a)] = value if a == 'count' else float(value)
+                rows.append(out)
+        rows.sort(key=lambda r: tuple(r[d] for d in self.dims))
+        return rows
+
+    def save(self, filename):
+        write_cube_csv(filename, self.cube_rows(DISTRIBUTIVE), self.dims,
+                       self.measure, DISTRIBUTIVE)
+
+
+def write_cube_csv(filename, cube_rows, dims, measure, aggregates=('sum',)):
+    fieldnames = dims + [aggregate_column(measure, a) for a in aggregates]
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for r in cube_rows:
+            writer.writerow(r)
+
+
+def load_cube(filename, measure, fill_value='ALL'):
+    # reads back a cube written with the distributive aggregate columns
+    with open(filename, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        cube_rows = [row for row in reader]
+        fieldnames = reader.fieldnames or []
+    cols = [aggregate_column(measure, a) for a in DISTRIBUTIVE]
+    missing = [c for c in cols if c not in fieldnames]
+    if missing:
+        raise RuntimeError(
+            f"{filename} has no {missing} columns; rebuild it with olap.py first.")
+    agg_cols = {aggregate_column(measure, a) for a in AGGREGATES}
+    dims = [c for c in fieldnames if c not in agg_cols]
+    return PartialCube.from_cube_rows(cube_rows, dims, measure, fill_value)
+
+
+def build_partial_cube(rows, dims, measure, budget_rows, queries=None,
+                       fill_value='ALL'):
+    # queries default to every group-by, or to the low-dimensional ones once
+    # the full lattice is too large to enumerate
+    if queries is not None:
+        queries = [sum(1 << dims.index(d) for d in q) for q in queries]
+    elif len(dims) > FULL_CUBE_MAX_DIMS:
+        queries = [sum(1 << i for i in c)
+                   for r in range(PARTIAL_QUERY_DIMS + 1)
+                   for c in itertools.combinations(range(len(dims)), r)]
+    else:
+        queries = list(range(1 << len(dims)))
+    top = (1 << len(dims)) - 1
+    sizes = estimate_cuboid_sizes(rows, dims, set(queries) | {top})
+    views = select_views(sizes, len(dims), budget_rows, queries)
+    return PartialCube(rows, dims, measure, views, fill_value)
+
+
+def save_columnar(path, cube):
+    # one directory per cube: per cuboid, an int32 code array for each of its
+    # dimensions and a float64 array per aggregate, plus a JSON manifest
+    # holding the dictionaries; every array can be opened with np.memmap
+    if np is None:
+        raise RuntimeError("Columnar cube storage needs numpy installed.")
+    os.makedirs(path, exist_ok=True)
+    n_dims = len(cube.dims)
+    levels = [set() for _ in range(n_dims)]
+    for mask, cells in cube.cuboids.items():
+        positions = cube.positions(mask)
+        for key in cells:
+            for i, v in zip(positions, key):
+                levels[i].add(v)
+    levels = [sorted(v) for v in levels]
+    lookup = [{v: code for code, v in enumerate(vals)} for vals in levels]
+
+    cuboids = []
+    for mask in sorted(cube.cuboids):
+        cells = cube.cuboids[mask]
+        keys = sorted(cells)
+        positions = cube.positions(mask)
+        files = {}
+        for j, i in enumerate(positions):
+            name = f"c{mask}_d{i}.i4"
+            np.array([lookup[i][k[j]] for k in keys], dtype=np.int32).tofile(
+                os.path.join(path, name))
+            files[cube.dims[i]] = name
+        for a_i, agg in enumerate(DISTRIBUTIVE):
+            name = f"c{mask}_{agg}.f8"
+            np.array([cells[k][a_i] for k in keys], dtype=np.float64).tofile(
+                os.path.join(path, name))
+            files[agg] = name
+        cuboids.append({'dims': [cube.dims[i] for i in positions],
+                        'rows': len(keys), 'files': files})
+
+    manifest = {'dims': cube.dims, 'measure': cube.measure,
+                'fill_value': cube.fill_value, 'levels': levels,
+                'cuboids': cuboids}
+    with open(os.path.join(path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+class MappedCube:
+    # a columnar cube opened read-only with np.memmap: opening reads only the
+    # manifest, and each query maps just the columns of the cuboids it needs
+    def __init__(self, path):
+        if np is None:
+            raise RuntimeError("Columnar cube storage needs numpy installed.")
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.path = path
+        self.dims = manifest['dims']
+        self.measure = manifest['measure']
+        self.fill_value = manifest['fill_value']
+        self.levels = manifest['levels']
+        self.lookup = [{v: code for code, v in enumerate(vals)} for vals in self.levels]
+        self.cuboids = {frozenset(c['dims']): c for c in manifest['cuboids']}
+
+    def column(self, cuboid, name, dtype):
+        if cuboid['rows'] == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, cuboid['files'][name]),
+                         dtype=dtype, mode='r', shape=(cuboid['rows'],))
+
+    def __len__(self):
+        return sum(c['rows'] for c in self.cuboids.values())
+
+    def __iter__(self):
+        return iter(self.match(lambda key: True))
+
+    def match(self, wanted, filters=None):
+        # rows of every stored cuboid accepted by `wanted`, restricted to
+        # `filters`, in the same sorted order as cube_rows
+        res = []
+        for key, cuboid in self.cuboids.items():
+            if not wanted(key):
+                continue
+            sel = self.select(key, cuboid, filters or {})
+            if sel is None:
+                continue
+            res.extend(self.rows(cuboid, sel))
+        res.sort(key=lambda r: tuple(r[d] for d in self.dims))
+        return res
+
+    def select(self, key, cuboid, filters):
+        sel = np.ones(cuboid['rows'], dtype=bool)
+        for d, v in filters.items():
+            wanted = {str(x) for x in v} if isinstance(v, (list, tuple, set)) else {str(v)}
+            if d not in key:
+                if self.fill_value not in wanted:
+                    return None
+                continue
+            i = self.dims.index(d)
+            codes = [self.lookup[i][w] for w in wanted if w in self.lookup[i]]
+            if not codes:
+                return None
+            sel &= np.isin(self.column(cuboid, d, np.int32), codes)
+        return np.nonzero(sel)[0]
+
+    def rows(self, cuboid, sel):
+        cols = {d: self.column(cuboid, d, np.int32)[sel] for d in cuboid['dims']}
+        sums = self.column(cuboid, 'sum', np.float64)[sel]
+        out = []
+        for j in range(len(sel)):
+            r = {d: self.fill_value for d in self.dims}
+            for d, codes in cols.items():
+                r[d] = self.levels[self.dims.index(d)][codes[j]]
+            r[self.measure] = float(sums[j])
+            out.append(r)
+        return out
+
+    def roll_up(self, target_dims):
+        target = set(target_dims)
+        return OlapCube(self.match(lambda key: key <= target), self.dims,
+                        self.measure, self.fill_value).roll_up(target_dims)
+
+    def drill_down(self, drill_dims):
+        drill = set(drill_dims)
+        return OlapCube(self.match(lambda key: key >= drill), self.dims,
+                        self.measure, self.fill_value).drill_down(drill_dims)
+
+    def slice(self, slice_dim, value):
+        return self.match(lambda key: True, {slice_dim: value})
+
+    def dice(self, filters):
+        return self.match(lambda key: True, filters)
+
+
+def cell_aggregates(values):
+    total = sum(values)
+    return {'sum': float(total), 'count': len(values), 'min': min(values),
+            'max': max(values), 'avg': total / len(values)}
+
+
+def prunable(agg, op, non_negative):
+    # conditions that can only get harder to meet as a partition shrinks;
+    # only these let BUC skip a partition's whole sub-lattice
+    if op == '>=':
+        return agg in ('count', 'max') or (agg == 'sum' and non_negative)
+    return agg == 'min'
+
+
+def build_iceberg_cube(rows, dims, measure, having=('count', '>=', 2),
+                       fill_value='ALL'):
+    # bottom-up cube (BUC): partition on one dimension at a time and only
+    # recurse into partitions whose cells can still meet `having`
+    agg, op, threshold = having
+    if agg not in AGGREGATES:
+        raise ValueError(f"aggregate must be one of {AGGREGATES}")
+    if op not in ('>=', '<='):
+        raise ValueError("having operator must be '>=' or '<='")
+
+    values = [r[measure] for r in rows]
+    columns = [[r[d] for r in rows] for d in dims]
+    # high-cardinality dimensions first make partitions shrink fastest
+    order = sorted(range(len(dims)), key=lambda i: -len(set(columns[i])))
+    prune = prunable(agg, op, all(v >= 0 for v in values))
+
+    def passes(stats):
+        return stats[agg] >= threshold if op == '>=' else stats[agg] <= threshold
+
+    cells = []
+
+    def buc(ids, start, fixed):
+        stats = cell_aggregates([values[i] for i in ids])
+        ok = passes(stats)
+        if not ok and prune:
+            return
         if ok:
-            res.append({d: r[d] for d in dims + [measure]})
-    return res
+            out = {d: fill_value for d in dims}
+            for i, v in fixed:
+                out[dims[i]] = v
+            for a in AGGREGATES:
+                out[aggregate_column(measure, a)] = stats[a]
+            cells.append(out)
+        for pos in range(start, len(order)):
+            d = order[pos]
+            col = columns[d]
+            parts = defaultdict(list)
+            for i in ids:
+                parts[col[i]].append(i)
+            for v, part in parts.items():
+                buc(part, pos + 1, fixed + [(d, v)])
+
+    if rows:
+        buc(list(range(len(rows))), 0, [])
+    cells.sort(key=lambda r: tuple(r[d] for d in dims))
+    return cells
+
 
 def print_menu(dims, measure):
     print("\nChoose an operation to perform on the cube:")
@@ -211,21 +901,69 @@ def print_table(rows, columns):
         line = ' | '.join(str(r.get(c, '')).ljust(widths[c]) for c in columns)
         print(line)
         
+CUBE_STORE = 'cube_output.cube'
+
+
+def append_rows(cube_path, rows_path, measure, store_path=CUBE_STORE):
+    # fold newly landed fact rows into a saved cube without rebuilding it
+    cube = load_cube(cube_path, measure)
+    rows, dims, _ = read_data(rows_path, measure)
+    if dims != cube.dims:
+        raise RuntimeError(f"New rows have dimensions {dims}, cube has {cube.dims}.")
+    cube.add_rows(rows)
+    cube.save(cube_path)
+    if np is not None:
+        save_columnar(store_path, cube)
+    print(f"Added {len(rows)} rows to {cube_path} "
+          f"({sum(len(c) for c in cube.cuboids.values())} cells).")
+    return cube
+
+
 def main():
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Build, update or query an OLAP cube.")
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--append',
+                           help="CSV of new fact rows to add to the saved cube")
+        group.add_argument('--open', metavar='STORE',
+                           help="query a saved columnar cube without rebuilding it")
+        parser.add_argument('--measure', help="measure column (needed with --append)")
+        parser.add_argument('--cube', default='cube_output.csv')
+        args = parser.parse_args()
+        if args.open:
+            cube = MappedCube(args.open)
+            interactive_cli(cube, cube.dims, cube.measure)
+        elif not args.measure:
+            parser.error("--append needs --measure")
+        else:
+            append_rows(args.cube, args.append, args.measure)
+        return
+
     rows, dims, measure = read_data()
     print("\nInput Data:")
     print_table(rows, dims + [measure])
-    cube_rows = build_olap_cube(rows, dims, measure)
+    if len(dims) > FULL_CUBE_MAX_DIMS:
+        # 2^d cuboids is out of reach: keep a greedy selection within a
+        # budget of as many cells as there are input rows
+        cube = build_partial_cube(rows, dims, measure, budget_rows=len(rows))
+        cube.save('cube_output.csv')
+        if np is not None:
+            save_columnar(CUBE_STORE, cube)
+        print(f"\n{len(dims)} dimensions: materialised {len(cube.cuboids)} "
+              f"of {2 ** len(dims)} cuboids.")
+        print("Materialised cuboids saved to: cube_output.csv")
+        print("Use PartialCube.query() for group-bys over this cube.")
+        return
+    cube_rows = build_olap_cube(rows, dims, measure, aggregates=DISTRIBUTIVE)
     print("\nGenerated OLAP Cube:")
     print_table(cube_rows, dims + [measure])
 
-    with open('cube_output.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=dims + [measure])
-        writer.writeheader()
-        for r in cube_rows:
-            writer.writerow(r)
+    write_cube_csv('cube_output.csv', cube_rows, dims, measure, DISTRIBUTIVE)
     print("\nCube saved to: cube_output.csv")
-    interactive_cli(cube_rows, dims, measure)
+    if np is not None:
+        save_columnar(CUBE_STORE, PartialCube.from_cube_rows(cube_rows, dims, measure))
+        print(f"Columnar cube saved to: {CUBE_STORE} (reopen with --open {CUBE_STORE})")
+    interactive_cli(OlapCube(cube_rows, dims, measure), dims, measure)
 
 if __name__ == "__main__":
     main()